@@ -0,0 +1,84 @@
+"""Write throughput of WinZip AES encrypted archives.
+
+Usage: python benchmarks/bench_aes_write.py [--total MB] [--large] [--repeat R]
+
+Members of 1 KB and 1 MB are written until --total megabytes have been
+stored; --large adds a single 1 GB member written through open('w').
+Throughput is reported in MB/s of uncompressed input.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from gatecode.a import AESZipFile  # noqa: E402
+from gatecode.b import WZ_AES, ZIP_DEFLATED, ZIP_STORED  # noqa: E402
+
+PASSWORD = b'gatecode-benchmark'
+CHUNK = 1 << 20
+MB = 1 << 20
+
+
+def write_archive(path, member_size, count, compression, encrypted):
+    # Half random, half repetitive, so deflate has real work to do.
+    block = os.urandom(CHUNK // 2) + b'gatecode' * (CHUNK // 16)
+    kwargs = {'encryption': WZ_AES} if encrypted else {}
+    start = time.perf_counter()
+    with AESZipFile(path, 'w', compression=compression, **kwargs) as zf:
+        if encrypted:
+            zf.setpassword(PASSWORD)
+        if member_size <= CHUNK:
+            data = block[:member_size]
+            for i in range(count):
+                zf.writestr('m%d' % i, data)
+        else:
+            for i in range(count):
+                with zf.open('m%d' % i, 'w', force_zip64=True) as fp:
+                    for _ in range(member_size // CHUNK):
+                        fp.write(block)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--total', type=int, default=64,
+                        help='megabytes written per small-member case')
+    parser.add_argument('--large', action='store_true',
+                        help='also write a single 1 GB member')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [(1 << 10, args.total * MB >> 10), (MB, args.total)]
+    if args.large:
+        cases.append((1 << 30, 1))
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.zip')
+        for member_size, count in cases:
+            for compression, label in ((ZIP_STORED, 'stored'),
+                                       (ZIP_DEFLATED, 'deflated')):
+                for encrypted in (False, True):
+                    best = min(
+                        write_archive(path, member_size, count, compression,
+                                      encrypted)
+                        for _ in range(args.repeat))
+                    results.append({
+                        'member_size': member_size,
+                        'members': count,
+                        'compression': label,
+                        'encrypted': encrypted,
+                        'seconds': best,
+                        'mb_per_s': member_size * count / MB / best,
+                    })
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Time to close (write the central directory of) archives with many members.
+
+Usage: python benchmarks/bench_central_directory.py [--counts N,N,...] [--aes]
+
+Every member is a small stored file; only the time spent in close() is
+reported, together with the time taken to add the members.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from gatecode.a import AESZipFile  # noqa: E402
+from gatecode.b import WZ_AES, ZIP_STORED  # noqa: E402
+
+PASSWORD = b'gatecode-benchmark'
+
+
+def build_and_close(path, count, aes):
+    kwargs = {'encryption': WZ_AES} if aes else {}
+    zf = AESZipFile(path, 'w', compression=ZIP_STORED, **kwargs)
+    if aes:
+        zf.setpassword(PASSWORD)
+    start = time.perf_counter()
+    for i in range(count):
+        zf.writestr('dir%d/member%d.txt' % (i // 1000, i), b'x')
+    added = time.perf_counter()
+    zf.close()
+    closed = time.perf_counter()
+    return added - start, closed - added, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', default='10000,100000,1000000',
+                        help='comma separated member counts')
+    parser.add_argument('--aes', action='store_true',
+                        help='encrypt members, adding the WinZip AES extra')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.zip')
+        for count in map(int, args.counts.split(',')):
+            add_seconds, close_seconds, size = build_and_close(
+                path, count, args.aes)
+            results.append({
+                'members': count,
+                'aes': args.aes,
+                'add_seconds': add_seconds,
+                'close_seconds': close_seconds,
+                'archive_bytes': size,
+            })
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Cold-start vs warm-start import time with the dp code-object cache.
+
+Usage: python benchmarks/bench_code_cache.py [--modules N] [--repeat R]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import dpstub
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+CHILD = '''\
+import sys, time
+sys.path[:0] = [%(root)r, %(stub)r]
+start = time.perf_counter()
+from gatecode.a import dp_import
+dp_import([%(archive)r], cache_dir=%(cache)r)
+for name in %(modules)r:
+    __import__(name)
+print(time.perf_counter() - start)
+'''
+
+
+def run_child(archive, modules, stub, cache):
+    code = CHILD % dict(root=ROOT, stub=stub, archive=archive,
+                        modules=modules, cache=cache)
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return float(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modules', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stub = dpstub.write_stub(os.path.join(tmp, 'stub'))
+        modules = ['bench_mod_%d' % i for i in range(args.modules)]
+        archive = dpstub.build_dp_archive(os.path.join(tmp, 'bench.dp'),
+                                          modules)
+        cache = os.path.join(tmp, 'cache')
+        results = {'modules': args.modules, 'uncached': [], 'cold': [],
+                   'warm': []}
+        for _ in range(args.repeat):
+            results['uncached'].append(run_child(archive, modules, stub, None))
+            shutil.rmtree(cache, ignore_errors=True)
+            results['cold'].append(run_child(archive, modules, stub, cache))
+            results['warm'].append(run_child(archive, modules, stub, cache))
+        for key in ('uncached', 'cold', 'warm'):
+            results[key + '_best'] = min(results[key])
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""Read-path benchmarks of the zip engine against the stdlib zipfile.
+
+Usage: python benchmarks/bench_engine.py [--shapes S,...] [--compression C,...]
+           [--encryption E,...] [--repeat R] [--output FILE]
+
+Synthetic archives are generated in a temporary directory for every
+combination of shape, compression (stored, deflated, bzip2, lzma) and
+encryption (none, zipcrypto, aes128, aes256).  For each archive the time to
+open it, read throughput, random seek latency inside the largest member,
+extractall() and testzip() are measured with gatecode, and with the stdlib
+zipfile where it can read the archive (it has no WinZip AES support).
+
+Results are written as JSON, one record per archive, engine and measurement,
+together with the Python version and the git revision, so runs can be
+compared over time.  ZipCrypto is decrypted a byte at a time in Python by
+both engines and dominates the run time; leave it out with --encryption.
+gatecode does not write ZipCrypto, so those archives are built unencrypted
+and then encrypted member by member by build_zipcrypto_archive().
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from gatecode.a import AESZipFile  # noqa: E402
+from gatecode.b import (WZ_AES, ZIP_BZIP2, ZIP_DEFLATED,  # noqa: E402
+                        ZIP_LZMA, ZIP_STORED)
+
+PASSWORD = b'gatecode-benchmark'
+MB = 1 << 20
+
+# name: (member count, member size)
+SHAPES = {
+    'many-small': (2000, 1 << 10),
+    'medium': (64, 64 << 10),
+    'large': (2, 8 * MB),
+}
+COMPRESSION = {
+    'stored': ZIP_STORED,
+    'deflated': ZIP_DEFLATED,
+    'bzip2': ZIP_BZIP2,
+    'lzma': ZIP_LZMA,
+}
+# name: (encryption, encryption_kwargs); zipcrypto is applied afterwards.
+ENCRYPTION = {
+    'none': (None, None),
+    'zipcrypto': (None, None),
+    'aes128': (WZ_AES, {'nbits': 128}),
+    'aes256': (WZ_AES, {'nbits': 256}),
+}
+SEEKS = 50
+SEEK_READ = 4096
+
+
+def member_data(size, seed):
+    # Half random, half repetitive, so the compressors have real work to do.
+    rng = random.Random(seed)
+    half = size // 2
+    text = b'gatecode %d ' % seed
+    return (rng.getrandbits(half * 8).to_bytes(half, 'little')
+            + (text * (size // len(text) + 1))[:size - half])
+
+
+def build_archive(path, shape, compression, encryption):
+    count, size = SHAPES[shape]
+    method, kwargs = ENCRYPTION[encryption]
+    plain = path + '.plain' if encryption == 'zipcrypto' else path
+    with AESZipFile(plain, 'w', compression=COMPRESSION[compression],
+                    encryption=method, encryption_kwargs=kwargs) as zf:
+        if method is not None:
+            zf.setpassword(PASSWORD)
+        for i in range(count):
+            zf.writestr('dir%d/member%d.bin' % (i % 16, i),
+                        member_data(size, i))
+    if plain != path:
+        build_zipcrypto_archive(plain, path, PASSWORD)
+        os.remove(plain)
+    return count * size
+
+
+def _crc_table():
+    table = []
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            c = (c >> 1) ^ 0xEDB88320 if c & 1 else c >> 1
+        table.append(c)
+    return table
+
+
+class _ZipCrypto:
+    """The traditional PKWARE cipher, for building fixtures only."""
+
+    table = _crc_table()
+
+    def __init__(self, password):
+        self.keys = [0x12345678, 0x23456789, 0x34567890]
+        for c in password:
+            self._update(c)
+
+    def _update(self, c):
+        table = self.table
+        key0, key1, key2 = self.keys
+        key0 = (key0 >> 8) ^ table[(key0 ^ c) & 0xFF]
+        key1 = ((key1 + (key0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        key2 = (key2 >> 8) ^ table[(key2 ^ (key1 >> 24)) & 0xFF]
+        self.keys = [key0, key1, key2]
+
+    def encrypt(self, data):
+        result = bytearray(data)
+        for i, c in enumerate(result):
+            k = self.keys[2] | 2
+            result[i] = c ^ (((k * (k ^ 1)) >> 8) & 0xFF)
+            self._update(c)
+        return bytes(result)
+
+
+def build_zipcrypto_archive(plain, path, password):
+    """Write to path the archive plain with every member ZipCrypto encrypted.
+
+    The compressed data of each member is encrypted as it is stored, behind
+    the 12 byte encryption header, whose check byte is the top byte of the
+    CRC, so no data descriptor is needed.  Comments, extra fields and ZIP64
+    are not carried over, which the generated archives do not need.
+    """
+    entries = []
+    with zipfile.ZipFile(plain) as zf, open(plain, 'rb') as src, \
+            open(path, 'wb') as out:
+        for zinfo in zf.infolist():
+            src.seek(zinfo.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', src.read(4))
+            src.seek(name_length + extra_length, 1)
+            name = zinfo.filename.encode('utf-8')
+            year, month, day, hour, minute, second = zinfo.date_time
+            fields = (
+                20,  # version needed to extract
+                (zinfo.flag_bits | 0x1 | 0x800) & ~0x8,
+                zinfo.compress_type,
+                hour << 11 | minute << 5 | second // 2,
+                (year - 1980) << 9 | month << 5 | day,
+                zinfo.CRC,
+                zinfo.compress_size + 12,
+                zinfo.file_size,
+            )
+            offset = out.tell()
+            out.write(struct.pack('<4s5H3L2H', b'PK\x03\x04', *fields,
+                                  len(name), 0) + name)
+            cipher = _ZipCrypto(password)
+            out.write(cipher.encrypt(os.urandom(11) +
+                                     bytes([zinfo.CRC >> 24])))
+            left = zinfo.compress_size
+            while left:
+                data = src.read(min(left, MB))
+                out.write(cipher.encrypt(data))
+                left -= len(data)
+            entries.append((zinfo, fields, name, offset))
+        start = out.tell()
+        for zinfo, fields, name, offset in entries:
+            out.write(struct.pack('<4s6H3L5H2L', b'PK\x01\x02',
+                                  zinfo.create_system << 8 | 20, *fields,
+                                  len(name), 0, 0, 0, 0, zinfo.external_attr,
+                                  offset) + name)
+        out.write(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, len(entries),
+                              len(entries), out.tell() - start, start, 0))
+
+
+class Engine:
+    """Opens archives with one zip implementation."""
+
+    def __init__(self, name, opener):
+        self.name = name
+        self.opener = opener
+
+    def open(self, path):
+        zf = self.opener(path)
+        zf.setpassword(PASSWORD)
+        return zf
+
+
+ENGINES = [
+    Engine('gatecode', AESZipFile),
+    Engine('stdlib', zipfile.ZipFile),
+]
+
+
+def supports(engine, encryption):
+    return engine.name != 'stdlib' or not encryption.startswith('aes')
+
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_open(engine, path):
+    engine.open(path).close()
+
+
+def bench_read(engine, path):
+    with engine.open(path) as zf:
+        for zinfo in zf.infolist():
+            with zf.open(zinfo) as fp:
+                while fp.read(MB):
+                    pass
+
+
+def bench_seek(engine, path):
+    """Return the median and worst latency of random seek + read calls."""
+    rng = random.Random(0)
+    latencies = []
+    with engine.open(path) as zf:
+        zinfo = max(zf.infolist(), key=lambda zinfo: zinfo.file_size)
+        with zf.open(zinfo) as fp:
+            for _ in range(SEEKS):
+                offset = rng.randrange(max(zinfo.file_size - SEEK_READ, 1))
+                start = time.perf_counter()
+                fp.seek(offset)
+                fp.read(SEEK_READ)
+                latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies), max(latencies)
+
+
+def bench_extractall(engine, path, target):
+    shutil.rmtree(target, ignore_errors=True)
+    with engine.open(path) as zf:
+        zf.extractall(target)
+
+
+def bench_testzip(engine, path):
+    with engine.open(path) as zf:
+        bad = zf.testzip()
+    if bad is not None:
+        raise RuntimeError('%s: bad member %r' % (engine.name, bad))
+
+
+def run_case(path, tmp, shape, compression, encryption, repeat):
+    size = build_archive(path, shape, compression, encryption)
+    count = SHAPES[shape][0]
+    target = os.path.join(tmp, 'extract')
+    results = []
+    for engine in ENGINES:
+        if not supports(engine, encryption):
+            continue
+        record = {
+            'engine': engine.name,
+            'shape': shape,
+            'members': count,
+            'uncompressed_bytes': size,
+            'archive_bytes': os.path.getsize(path),
+            'compression': compression,
+            'encryption': encryption,
+        }
+        record['open_seconds'] = best_of(
+            repeat, lambda: bench_open(engine, path))
+        read = best_of(repeat, lambda: bench_read(engine, path))
+        record['read_seconds'] = read
+        record['read_mb_per_s'] = size / MB / read
+        median, worst = bench_seek(engine, path)
+        record['seek_median_seconds'] = median
+        record['seek_max_seconds'] = worst
+        record['extractall_seconds'] = best_of(
+            repeat, lambda: bench_extractall(engine, path, target))
+        record['testzip_seconds'] = best_of(
+            repeat, lambda: bench_testzip(engine, path))
+        results.append(record)
+        shutil.rmtree(target, ignore_errors=True)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def choices(value, known):
+    names = value.split(',')
+    for name in names:
+        if name not in known:
+            raise argparse.ArgumentTypeError(
+                '%r is not one of %s' % (name, ', '.join(known)))
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shapes', default=','.join(SHAPES),
+                        type=lambda v: choices(v, SHAPES))
+    parser.add_argument('--compression', default=','.join(COMPRESSION),
+                        type=lambda v: choices(v, COMPRESSION))
+    parser.add_argument('--encryption', default=','.join(ENCRYPTION),
+                        type=lambda v: choices(v, ENCRYPTION))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results to this file '
+                        'instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.zip')
+        for shape in args.shapes:
+            for compression in args.compression:
+                for encryption in args.encryption:
+                    results.extend(run_case(path, tmp, shape, compression,
+                                            encryption, args.repeat))
+    report = {
+        'benchmark': 'engine',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'revision': git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+            fp.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""Time-to-import of dp packages by package size and layout.
+
+Usage: python benchmarks/bench_import.py [--cases C,...] [--repeat R]
+           [--module-size N] [--prefetch] [--output FILE]
+
+Every case builds dp packages with the stub dploader and imports all of
+their modules in a fresh interpreter through add_dp_package(), the way an
+application starts:
+
+  flat-1, flat-100, flat-1000, flat-10000
+      one package holding that many modules
+  nested-1000
+      10 subpackages of 10 subpackages of 10 modules each
+  multi-8x125
+      eight packages of 125 modules, all on sys.path at once
+
+Each case is run cold, without a code cache, and warm, with the cache left
+by the previous run.  The child reports the time to set the packages up,
+the time to import their modules, the extra cost of importing ordinary
+modules from a directory once the dp import hook is installed, and its peak
+RSS.  The OS page cache is not dropped between runs, so cold means a cold
+code cache, not a cold disk.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+import dpstub
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# name: (package count, subpackages per level, modules per leaf package)
+CASES = {
+    'flat-1': (1, (), 1),
+    'flat-100': (1, (), 100),
+    'flat-1000': (1, (), 1000),
+    'flat-10000': (1, (), 10000),
+    'nested-1000': (1, (10, 10), 10),
+    'multi-8x125': (8, (), 125),
+}
+PLAIN_MODULES = 200
+
+CHILD = '''\
+import json, resource, sys, time
+sys.path[:0] = [%(root)r, %(stub)r]
+sys.path.append(%(plain_dir)r)
+start = time.perf_counter()
+if %(packages)r:
+    from gatecode.a import add_dp_package
+    keep = [add_dp_package(path, cache_dir=%(cache)r, prefetch=%(prefetch)r)
+            for path in %(packages)r]
+setup = time.perf_counter()
+for name in %(modules)r:
+    __import__(name)
+imported = time.perf_counter()
+for name in %(plain)r:
+    __import__(name)
+done = time.perf_counter()
+print(json.dumps({
+    'setup_seconds': setup - start,
+    'import_seconds': imported - setup,
+    'total_seconds': imported - start,
+    'plain_seconds': done - imported,
+    'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+def build_case(tmp, case, module_size):
+    """Build the packages of case; return their paths and module names."""
+    count, levels, modules_per_leaf = CASES[case]
+    paths = []
+    all_modules = []
+    for p in range(count):
+        leaves = ['bench_%s_%d' % (case.replace('-', '_'), p)]
+        packages = list(leaves)
+        for fanout in levels:
+            leaves = ['%s.sub%d' % (leaf, s) for leaf in leaves
+                      for s in range(fanout)]
+            packages.extend(leaves)
+        modules = ['%s.mod%d' % (leaf, m) for leaf in leaves
+                   for m in range(modules_per_leaf)]
+        # add_dp_package() takes a zip named after the package holding
+        # <name>.dp, as shipped.
+        name = 'pkg%d' % p
+        dp = dpstub.build_dp_archive(os.path.join(tmp, name + '.dp'), modules,
+                                     packages, module_size)
+        wrapper = os.path.join(tmp, name)
+        with zipfile.ZipFile(wrapper, 'w') as zf:
+            zf.write(dp, name + '.dp')
+        os.remove(dp)
+        paths.append(wrapper)
+        all_modules.extend(modules)
+    return paths, all_modules
+
+
+def build_plain(tmp):
+    """Write ordinary modules with up to date bytecode; return their names."""
+    directory = os.path.join(tmp, 'plain')
+    os.makedirs(directory)
+    names = ['bench_plain_%d' % i for i in range(PLAIN_MODULES)]
+    for name in names:
+        with open(os.path.join(directory, name + '.py'), 'w') as fp:
+            fp.write('VALUE = %r\n' % name)
+    subprocess.check_call([sys.executable, '-m', 'compileall', '-q',
+                           directory])
+    return directory, names
+
+
+def run_child(stub, plain_dir, plain, packages, modules, cache, prefetch):
+    code = CHILD % dict(root=ROOT, stub=stub, plain_dir=plain_dir,
+                        plain=plain, packages=packages, modules=modules,
+                        cache=cache, prefetch=prefetch)
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(out)
+
+
+def best(runs):
+    """Return the run with the shortest total time."""
+    return min(runs, key=lambda run: run['total_seconds'])
+
+
+def choices(value):
+    names = value.split(',')
+    for name in names:
+        if name not in CASES:
+            raise argparse.ArgumentTypeError(
+                '%r is not one of %s' % (name, ', '.join(CASES)))
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', default=','.join(CASES), type=choices)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--module-size', type=int, default=1000,
+                        help='approximate source size of each module')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='pass prefetch=True to add_dp_package()')
+    parser.add_argument('--output', help='write the results to this file '
+                        'instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        stub = dpstub.write_stub(os.path.join(tmp, 'stub'))
+        plain_dir, plain = build_plain(tmp)
+        baseline = best([run_child(stub, plain_dir, plain, [], [], None, False)
+                         for _ in range(args.repeat)])
+        for case in args.cases:
+            case_dir = os.path.join(tmp, case)
+            os.makedirs(case_dir)
+            packages, modules = build_case(case_dir, case, args.module_size)
+            cache = os.path.join(case_dir, 'cache')
+            cold = []
+            warm = []
+            for _ in range(args.repeat):
+                shutil.rmtree(cache, ignore_errors=True)
+                cold.append(run_child(stub, plain_dir, plain, packages,
+                                      modules, None, args.prefetch))
+                run_child(stub, plain_dir, plain, packages, modules, cache,
+                          args.prefetch)
+                warm.append(run_child(stub, plain_dir, plain, packages,
+                                      modules, cache, args.prefetch))
+            for mode, runs in (('cold', cold), ('warm', warm)):
+                run = best(runs)
+                overhead = run['plain_seconds'] - baseline['plain_seconds']
+                results.append(dict(
+                    run,
+                    case=case,
+                    mode=mode,
+                    packages=len(packages),
+                    modules=len(modules),
+                    per_module_seconds=run['import_seconds'] / len(modules),
+                    plain_overhead_per_import_seconds=overhead / len(plain),
+                ))
+            shutil.rmtree(case_dir)
+
+    report = {
+        'benchmark': 'import',
+        'python': sys.version.split()[0],
+        'prefetch': args.prefetch,
+        'baseline_peak_rss_kb': baseline['peak_rss_kb'],
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+            fp.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Memory high-water marks of reading large members, checked against budgets.
+
+Usage: python benchmarks/bench_memory.py [--size MB] [--ops O,...]
+           [--compression C,...] [--encryption E,...] [--output FILE]
+
+An archive holding a single member of --size megabytes is generated for
+every compression (stored, deflated, bzip2, lzma) and encryption mode
+(none, aes256 and, on request, zipcrypto).  Each operation then runs in a
+fresh interpreter, once to take the growth of the peak RSS and once for the
+tracemalloc peak:
+
+  read      zf.read(name), the whole member at once
+  chunked   ZipExtFile.read(1 MiB) until EOF
+  extract   zf.extract(name)
+  testzip   zf.testzip()
+
+Every operation has a budget of a multiple of the member size plus a fixed
+allowance (see BUDGETS).  read() is also timed, best of three, against a
+chunked read of the same member (see TIME_BUDGETS): assembling the result
+must cost about one more copy of the member, not one per block read.  The
+results are written as JSON and the exit
+status is 1 if any measurement is over its budget, so the suite can gate a
+release.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from gatecode.a import AESZipFile  # noqa: E402
+from gatecode.b import (WZ_AES, ZIP_BZIP2, ZIP_DEFLATED,  # noqa: E402
+                        ZIP_LZMA, ZIP_STORED)
+
+from bench_engine import build_zipcrypto_archive  # noqa: E402
+
+PASSWORD = b'gatecode-benchmark'
+MB = 1 << 20
+CHUNK = MB
+
+COMPRESSION = {
+    'stored': ZIP_STORED,
+    'deflated': ZIP_DEFLATED,
+    'bzip2': ZIP_BZIP2,
+    'lzma': ZIP_LZMA,
+}
+# zipcrypto is applied afterwards, as gatecode does not write it.
+ENCRYPTION = {
+    'none': None,
+    'aes256': WZ_AES,
+    'zipcrypto': None,
+}
+# op: (multiple of the member size, fixed allowance in bytes).  read()
+# returns the member, so it cannot take less than the member size; it peaks
+# at about twice that while the result is assembled.  The streaming
+# operations must not grow with the member at all.
+BUDGETS = {
+    'read': (2.5, 32 * MB),
+    'chunked': (0.0, 32 * MB),
+    'extract': (0.0, 32 * MB),
+    'testzip': (0.0, 32 * MB),
+}
+# op: (multiple of the time of the chunked read, fixed allowance in
+# seconds).  A read() that copies what it has so far for every block it
+# adds takes several times longer than a chunked read from 64 MB on.
+TIME_BUDGETS = {
+    'read': (3.0, 0.1),
+}
+TIME_RUNS = 3
+
+CHILD = '''\
+import resource, sys, time, tracemalloc
+sys.path.insert(0, %(root)r)
+from gatecode.a import AESZipFile
+zf = AESZipFile(%(archive)r)
+zf.setpassword(%(password)r)
+name = zf.namelist()[0]
+
+def run():
+    op = %(op)r
+    if op == 'read':
+        return len(zf.read(name))
+    if op == 'chunked':
+        total = 0
+        with zf.open(name) as fp:
+            while True:
+                data = fp.read(%(chunk)d)
+                if not data:
+                    return total
+                total += len(data)
+    if op == 'extract':
+        zf.extract(name, %(target)r)
+        return 0
+    if op == 'testzip':
+        assert zf.testzip() is None
+        return 0
+
+if %(mode)r == 'time':
+    best = None
+    for _ in range(%(runs)d):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(best)
+elif %(mode)r == 'trace':
+    tracemalloc.start()
+    run()
+    print(tracemalloc.get_traced_memory()[1])
+else:
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    run()
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print((after - before) * 1024)
+'''
+
+
+def build_archive(path, size, compression, encryption):
+    # Half random, half repetitive, written a chunk at a time.
+    rng = random.Random(0)
+    plain = path + '.plain' if encryption == 'zipcrypto' else path
+    with AESZipFile(plain, 'w', compression=COMPRESSION[compression],
+                    encryption=ENCRYPTION[encryption]) as zf:
+        if ENCRYPTION[encryption] is not None:
+            zf.setpassword(PASSWORD)
+        with zf.open('member.bin', 'w', force_zip64=True) as fp:
+            for _ in range(size // CHUNK):
+                fp.write(rng.getrandbits(CHUNK * 4).to_bytes(CHUNK // 2,
+                                                             'little'))
+                fp.write(b'gatecode' * (CHUNK // 16))
+    if plain != path:
+        build_zipcrypto_archive(plain, path, PASSWORD)
+        os.remove(plain)
+
+
+def measure(archive, op, target, mode):
+    # mode is 'rss', 'trace' or 'time'; times are in seconds.
+    code = CHILD % dict(root=ROOT, archive=archive, password=PASSWORD,
+                        op=op, chunk=CHUNK, target=target, mode=mode,
+                        runs=TIME_RUNS)
+    value = subprocess.check_output([sys.executable, '-c', code])
+    return float(value) if mode == 'time' else int(value)
+
+
+def choices(known):
+    def parse(value):
+        names = value.split(',')
+        for name in names:
+            if name not in known:
+                raise argparse.ArgumentTypeError(
+                    '%r is not one of %s' % (name, ', '.join(known)))
+        return names
+    return parse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=64,
+                        help='member size in megabytes')
+    parser.add_argument('--ops', default=','.join(BUDGETS),
+                        type=choices(BUDGETS))
+    parser.add_argument('--compression', default=','.join(COMPRESSION),
+                        type=choices(COMPRESSION))
+    parser.add_argument('--encryption', default='none,aes256',
+                        type=choices(ENCRYPTION),
+                        help='zipcrypto is decrypted a byte at a time and '
+                        'is left out by default')
+    parser.add_argument('--output', help='write the results to this file '
+                        'instead of stdout')
+    args = parser.parse_args()
+
+    size = args.size * MB
+    results = []
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, 'bench.zip')
+        target = os.path.join(tmp, 'extract')
+        for compression in args.compression:
+            for encryption in args.encryption:
+                build_archive(archive, size, compression, encryption)
+                for op in args.ops:
+                    factor, allowance = BUDGETS[op]
+                    budget = int(factor * size) + allowance
+                    rss = measure(archive, op, target, 'rss')
+                    traced = measure(archive, op, target, 'trace')
+                    ok = rss <= budget and traced <= budget
+                    result = {
+                        'op': op,
+                        'compression': compression,
+                        'encryption': encryption,
+                        'member_bytes': size,
+                        'budget_bytes': budget,
+                        'peak_rss_growth_bytes': rss,
+                        'tracemalloc_peak_bytes': traced,
+                    }
+                    if op in TIME_BUDGETS:
+                        factor, allowance = TIME_BUDGETS[op]
+                        chunked = measure(archive, 'chunked', target, 'time')
+                        seconds = measure(archive, op, target, 'time')
+                        time_budget = factor * chunked + allowance
+                        ok = ok and seconds <= time_budget
+                        result.update({
+                            'seconds': seconds,
+                            'chunked_seconds': chunked,
+                            'time_budget_seconds': time_budget,
+                        })
+                    result['ok'] = ok
+                    failed = failed or not ok
+                    results.append(result)
+
+    report = {
+        'benchmark': 'memory',
+        'python': sys.version.split()[0],
+        'failed': failed,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+            fp.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
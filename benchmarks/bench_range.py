@@ -0,0 +1,127 @@
+"""Range requests made to open an archive on a remote store and read a member.
+
+Usage: python benchmarks/bench_range.py [--counts N,N,...] [--member-size KB]
+           [--latency S] [--block-size KB] [--output FILE]
+
+For every count an archive of that many deflated members is read through a
+RangeFile over a LocalRangeReader, which sleeps --latency seconds before
+every request as a remote store would take to answer.  Opening the archive
+and reading one member from the middle of it are measured separately:
+requests, bytes and seconds.  The requests of a read include any prefetch
+it started, counted once the RangeFile is closed.
+
+Every step has a budget of requests (see REQUEST_BUDGETS).  The results are
+written as JSON and the exit status is 1 if any step makes more requests
+than its budget, so the suite can gate a release.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from gatecode.b import ZIP_DEFLATED, ZipFile  # noqa: E402
+from gatecode.r import LocalRangeReader, RangeFile  # noqa: E402
+
+KB = 1 << 10
+# step: most requests allowed.  Opening reads the end record and the
+# central directory, one request unless the directory reaches back past
+# the last block.  A member costs one request, two when its record
+# straddles a block boundary.
+REQUEST_BUDGETS = {
+    'open': 2,
+    'read': 2,
+}
+
+
+def build_archive(path, count, member_size):
+    # Half random, half repetitive, like compiled modules.
+    rng = random.Random(0)
+    with ZipFile(path, 'w', compression=ZIP_DEFLATED) as zf:
+        for i in range(count):
+            zf.writestr('pkg%d/m%d.dpx' % (i // 1000, i),
+                        rng.randbytes(member_size // 2) +
+                        b'x' * (member_size - member_size // 2))
+
+
+def measure(path, latency, block_size):
+    reader = LocalRangeReader(path, latency=latency)
+    fp = RangeFile(reader, block_size=block_size)
+    steps = {}
+    try:
+        start = time.perf_counter()
+        with ZipFile(fp) as zf:
+            opened = time.perf_counter()
+            steps['open'] = (reader.requests, reader.bytes_read,
+                             opened - start)
+            names = zf.namelist()
+            zf.read(names[len(names) // 2])
+            read = time.perf_counter()
+    finally:
+        # Waits for the prefetches still running.
+        fp.close()
+    steps['read'] = (reader.requests - steps['open'][0],
+                     reader.bytes_read - steps['open'][1], read - opened)
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', default='1000,20000',
+                        help='comma separated member counts')
+    parser.add_argument('--member-size', type=int, default=2,
+                        help='member size in kilobytes')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds every request takes')
+    parser.add_argument('--block-size', type=int, default=1024,
+                        help='RangeFile block size in kilobytes')
+    parser.add_argument('--output', help='write the results to this file '
+                        'instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.zip')
+        for count in map(int, args.counts.split(',')):
+            build_archive(path, count, args.member_size * KB)
+            steps = measure(path, args.latency, args.block_size * KB)
+            for step, (requests, nbytes, seconds) in steps.items():
+                ok = requests <= REQUEST_BUDGETS[step]
+                failed = failed or not ok
+                results.append({
+                    'step': step,
+                    'members': count,
+                    'archive_bytes': os.path.getsize(path),
+                    'latency_seconds': args.latency,
+                    'block_bytes': args.block_size * KB,
+                    'budget_requests': REQUEST_BUDGETS[step],
+                    'requests': requests,
+                    'bytes_read': nbytes,
+                    'seconds': seconds,
+                    'ok': ok,
+                })
+
+    report = {
+        'benchmark': 'range',
+        'python': sys.version.split()[0],
+        'failed': failed,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+            fp.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Member write throughput by write size, with and without coalescing.
+
+Usage: python benchmarks/bench_small_writes.py [--total MB] [--repeat R]
+
+Each case writes --total megabytes into a single member through
+open('w'), in writes of 16 bytes, 1 KiB and 1 MiB, once with the default
+ZipFile.write_buffer_size and once with coalescing disabled.  Throughput
+is reported in MB/s of uncompressed input.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from gatecode.a import AESZipFile  # noqa: E402
+from gatecode.b import WZ_AES, ZIP_DEFLATED, ZIP_STORED, ZipFile  # noqa: E402
+
+PASSWORD = b'gatecode-benchmark'
+MB = 1 << 20
+WRITE_SIZES = (16, 1 << 10, MB)
+
+
+def write_member(path, total, write_size, compression, encrypted, buffered):
+    chunk = (b'%08d,gatecode,row\n' * (write_size // 16 + 1))[:write_size]
+    count = total // write_size
+    kwargs = {'encryption': WZ_AES} if encrypted else {}
+    start = time.perf_counter()
+    with AESZipFile(path, 'w', compression=compression, **kwargs) as zf:
+        if encrypted:
+            zf.setpassword(PASSWORD)
+        if not buffered:
+            zf.write_buffer_size = 0
+        with zf.open('member', 'w') as fp:
+            write = fp.write
+            for _ in range(count):
+                write(chunk)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--total', type=int, default=16,
+                        help='megabytes written per case')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    total = args.total * MB
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.zip')
+        for write_size in WRITE_SIZES:
+            for compression, label in ((ZIP_STORED, 'stored'),
+                                       (ZIP_DEFLATED, 'deflated')):
+                for encrypted in (False, True):
+                    for buffered in (False, True):
+                        best = min(
+                            write_member(path, total, write_size, compression,
+                                         encrypted, buffered)
+                            for _ in range(args.repeat))
+                        results.append({
+                            'write_size': write_size,
+                            'compression': label,
+                            'encrypted': encrypted,
+                            'write_buffer_size': (
+                                ZipFile.write_buffer_size if buffered else 0),
+                            'seconds': best,
+                            'mb_per_s': total / MB / best,
+                        })
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
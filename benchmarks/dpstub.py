@@ -0,0 +1,83 @@
+"""Helpers for building dp-style archives without the native dploader.
+
+The stub ``dploader`` module written by write_stub() mimics the interface of
+the real extension: ``midas_finger`` sets the archive password and
+``decrypt_and_load`` turns a member payload back into a code object.  The
+payloads built here are plain pyc images stored as WinZip AES members, so
+the benchmarks measure the archive and import machinery rather than the
+native decryption.
+"""
+import importlib.util
+import marshal
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gatecode.a import AESZipFile  # noqa: E402
+from gatecode.b import WZ_AES, ZIP_DEFLATED  # noqa: E402
+
+PASSWORD = b'gatecode-benchmark'
+
+STUB_SOURCE = '''\
+import importlib.util
+import marshal
+
+PASSWORD = %r
+
+
+def midas_finger(zip_file):
+    zip_file.setpassword(PASSWORD)
+
+
+def decrypt_and_load(data):
+    magic = importlib.util.MAGIC_NUMBER
+    if data[:4] != magic:
+        raise ImportError('Invalid magic number: received 0x%%s, expected 0x%%s.'
+                          %% (data[:4].hex().upper(), magic.hex().upper()))
+    return marshal.loads(data[16:])
+''' % (PASSWORD,)
+
+
+def write_stub(directory):
+    """Write the stub dploader module into directory."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'dploader.py'), 'w') as fp:
+        fp.write(STUB_SOURCE)
+    return directory
+
+
+def dpx_payload(source, filename='<dpx>'):
+    """Return the stub payload for a module's source code."""
+    code = compile(source, filename, 'exec')
+    return importlib.util.MAGIC_NUMBER + bytes(12) + marshal.dumps(code)
+
+
+def module_source(name, size=2000):
+    """Return synthetic source for a module of roughly size bytes."""
+    lines = ['NAME = %r' % name]
+    i = 0
+    while sum(len(line) + 1 for line in lines) < size:
+        lines.append('def f%d(a, b):\n    return a * %d + b * %d\n' % (i, i, i + 1))
+        i += 1
+    return '\n'.join(lines) + '\n'
+
+
+def build_dp_archive(path, modules, packages=(), module_size=2000):
+    """Build a dp archive at path.
+
+    modules is an iterable of dotted module names stored as ``.dpx``
+    members encrypted with PASSWORD, packages an iterable of dotted package
+    names stored as plain ``__init__.py`` members.
+    """
+    with AESZipFile(path, 'w', compression=ZIP_DEFLATED) as zf:
+        for name in packages:
+            zf.writestr(name.replace('.', '/') + '/__init__.py',
+                        module_source(name, module_size))
+        zf.setpassword(PASSWORD)
+        zf.setencryption(WZ_AES)
+        for name in modules:
+            arcname = name.replace('.', '/') + '.dpx'
+            zf.writestr(arcname, dpx_payload(module_source(name, module_size),
+                                             arcname))
+    return path
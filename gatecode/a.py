@@ -1,2 +1,2 @@
 def obfDecode(data): return __import__('zlib').decompress(__import__('base64').b64decode(data[::-1]))
-exec(obfDecode(b'=4Jpgx6Hqn9Qvv+B6uTXWTGYQHXxR5NAHw+HETpgtemIHrq5kewkHGbYJheWMNzqYxM/8PEy2FJTk0RutkFjDRYj4Xfzqf8E7Dq5U87wZfnh3V3nGJ1KI/U6sDXxi3Z3foRhGs3BOrTltM9WbjkpSN3ElemKkkQGx6DpWarKrW0cBpSPUeMzn03KEgPMszxATBIpwIytStpas1YM3gYLD6QJVsBm404V/IPHhXsS6ghrKpzrHGVAkg9WtrIibQzJqudL0i8fotpsHmp1jM9azReBlupvvCY4fAgzj9CVaCJcR7sGHUQGk46wBI21VtI6FKaoarR0aBvNbuuTdRddadS2vA2lwoCsChxzoXZ8vRZNIiaxx18B8Ntl4N7cWhvkR1Z0RXxzPQjTVnEJiDKkP/qunJRRMxi+F6W32t96UrrNpNHUb5H6omNV97nKTUyrpcZumube0aM7Ss4mu6AepwqH3G5RIyFxUO77c6nEiNl55C5qYa+2KsCPq2Ax58qfJI42plEaJE8uxEXfrcEVucX+0ulqeeTIwutSyPjwByFrkcic/U6DurHVEscEewFak3afItcwqKSEuWVjEjwdIktcTl9y38ObqEDfqg7j5e+osOzTI0hkhxO3zv3cDf8YRxYpWXbmPed11EEt44xmLynxs4FwuozvliYKRC/1pl6fi9phPpODmDKAOwTc8c2sG3TFBlVFHaU6t5YgT1YRcccRQaINAE/+ZZljDLShBsWIcJ7f2uGNw9HgDlPfqWHHoNqHAd5u7FBYgHgTN7YGjVtG+1GmYAjcn00CssAYTYvPpW95ZGo80ltZm7RIpov6cVUDjJ7y3y6UyCkLrO3H93kvlHJ7V5bVZNJHrSroBPAO3weeVIwWQI1rm9gZnivEa2xbJ8DWtTEk5pqqO7kTPNxEcZvBjvmHyisCHHSG+/Q/EFxXIz16tDBKQn71ZLVU6egQ7qG/x2HstFG9z//VnZz5G9qEYfXtS1WMe65ifmEOMyPa59G9kFH+QPxT/kh0oM/BSjy4ImghzPspCvmbKXiP+cdVx0sRaLjwdIA6A+nggZkq5j/xtNTxHPkzT/zGBg7T9KcfX2tZ938y2W6nHAXXTaZz6Zovkvx6Yp/LTA6AjcNR1CO8jHzSa1Qf0vTzFOU6dR+pNE0tXvphtiE6JAk2LhkdlO6mZpWovVa6/yHNAThqGgIGXDVO07hK8HKqc88+ssf03BSiYg5KM8cB9bwQjdthY5zeQyE/z9PLcgOaYCNe7e1AkzKVJAlTx+QrCEGd44q5J62cotsCu6qBNxpnEXRq82Z0mo2XHQGUYnu3tzCJKAjSkf6C0+joohM4ba0+cMttCUUCInTELvqgMw0fBEo3adRNtcgxSigVSgF6V28nIkuc1k73rFwzSuI6/5pjNQ4u1fQEKZo8TdEy99UOIXcNwe5lt+EClfXN3B+GXsY8Z+SWxWSTjCislarrA7ImzEVR88ybEGzLHFswh8wxQourGTmnLKUcxxY4xPz9n1AMqRmHEdNnzJQM3ayD/CoeuuCbweYmmYr1NymD8GZ+JQ1AQfQTlDGcdPNVFmsXgX9qE8bRi3FIt6cKbs7OlWZS8XvxO9Ur7NVeWI9Ns2R8bpOrUgrKisUX/Mq+khwwrRDGQAp9SnjNEL5Y92T+lerdCsOR8jZ80UF6mitUOyi5KqdwSVub7MDLwriiw2VN/Uttg9OESDiRKjnO08deon54JQokJLNm/BSo5/AdVXVXVySTOEiJFJCBhinlRle2AY7JSTQBC5CwBhXrTQepgVh+AYgBAeo0ywFoGS+RnsKd8l53WxaJBln7SG/tdzs89djYoU/8Lu6s7Xex5n9D7WfzcioSMVhvNfubAh0mgZ6+mEbnl2cEIDVyQaAtVWakkLBoz4SAU/M4eAAMv+bcBJGNCdhApzKwxJZpIbvUkcgkGEpRqr+DmQ2kX+84+MEeXdaf59+ydsdylXsWwbVpfHTLyxdE7pwSgDg7tbrCQtGW4zJI0qGQXrdPRbDOoQ/7X/wpPzrWlb5xYvqoa+F3szBTX7Y+nWLnfxrm0PoXLdoE1ehdqeA2t2suT9miBuP+xsyfCBGt1sVRgPxNGYU0pRE3/VilGMsW9ZQ5ohr3Pwq2qEpCVLpWnheQ4RH9sB1+zdeFNU7EqCmrvti4wTM55pixnsY+3H8LL2+OSd+VpxiKB5OAOjr/Dh3X5gHVj0QQMhhZlx0dCNwbzW1gCt0HDHpnnafCgAuazNTqnEhMXTmGnZsaci1zW7EYJZmpXTu1IiBajnmtTf06oUzNKSLO5W9hCblZ4/w9X8JhdWcQ5VjyrWyissqmxbZSrUgMSDL1qwzXN2OIVGF7DCLfdwuR2k0KLbyyv2i5+jXEZx7mzLWx59yb1Mu4sTOlo+qKVvIyhuxb+KR3kYPalmCS8nY+UE1Yc+bMd5mTb1ikZh0+/XkbNl8J2ynWzZpzGSgEDwG0o4WsYRC0A5WBN072rurtPQSIf9rfMYD3vFVW9yJe'))
+exec(obfDecode(b'=cc2iaaA/lN2f+8rNebn0vdULyS6Sy7OATG7fIsuC5EsZ1kp1RrgiDrOrr0QeS7jyeKWJ7vtgEnzXQbyoJ+v+unR6rn/E4Wm2vx5GTxvhTtZmYvoPvjuj13HlObM6DLE8hyfNzu+H0gFiMIcn83wlq6LLa7T8R5/BUS9e2SbXBMqgd2k96eyyThyOSGdkmuP4RRNyGGZSGLLQsUeuNB2MzLyEtDEsRfSLFQuhh8hApedba7ZBMtEjVEFY4nSoyew5zWhug0KHWuIIeGvXoi31EGzvb7Sg55VXbFz+8aqglxP4bTWrAp/FvKtHGZUjM8ZlZeWpBrTrCeFjAeGETmIjSlDKUB4gOnnmK0VaFzh9F5L86gy1h2GJtGQJ4AoF8fd9Ydm2fD9BYwCZJ4FEFgPtKuXQFFPjWTFFxB07bH1cKudt9wtjq45Hv9xyZmmJ9BTzZva5WSDtpkHxKVte5F6l2R4U1XSNhJHsWXeyMOBqxai/0mreXSL74w/mpOgVVGNDeZGPPBuwwtzORjfOOxEfmTTDyuxWodWFVekIhUmEC060SGuHtJ7dyg21eqsiv6/ygo+wCR+VYoSW5JKpQhqC79tx0cv1rVSectgMOCqL2jL5vJVowzWiwhmp7QEp0K33yFnvLkTQs9CM8mCOXi7xh6mmEW8PktBe0IxlU9jP6nxDz38lu6c55cqKRoDySimNsKaYdJ4i77n6DEJHD3Rx178ZkGmmssdk15PBKLnyOimjE8BefzY1aJ/w3Ujf0ujSvNHbPQ0D2+1O8L28RbVJq4TEA+quqVjt28ltIjXKbQtKhpfT+CnFK8eVgSVWO4y1aPlYCzKC4/CwkjnGb1TroxPAFKTpCGjPjAOKfZoHttrimvUpT8eAEgk2mbZhD2UlB3hGijtntY4kCgiUokd2355Rmy2Y/d7aont3ki+eda3OJ9tH/j0kb+q9iWLHCe7VEe5bI6lXCbFEyeSzS2yXm/e8Un/Yp8TAN0XWy5UMO4de0ZcNqvK8Jcv9q4Ur2Ax51oTnYXGMEp/R8o+buO/2lunvoMP3ox/0d1jtx7VDKf8XexG2fjSrOnXOM6OHl0aHQnuNul1LGKgPhQVPLo7qYYKpVEvKCclYTVI26mTwVOG6zrPcM7ICzSPpVUVLM3FZqFWh+B1Q/n3dAvEVGBubo0q0OseU+tBKvrTfmf5wGIbAWrzyICTIJQgN03Ubb4yQ/P3E+WHfyPszBqqjFIlbE6sVRrKkkDtBUI0irKm0y80H2cpXbSoDaSKb0Ok0OlqEMcTgzukUVOdrlwwQTpFeQ+58x8fImtUnz6i9jw4oAMsqHjFlGOULLS682vh+FVhwMA9NTMqVTrlLP1zD/TevnFLfa2CNE39buad61/GRNXi4puOdAsmKNG7FoteTxmGzXlqgypun+KFE0xDAOJhMnELzSMXWQ/Npke1GhR91AIOXb4XYtY4Orqq+K29SB9rcGGOPyI9Tg31GQWQJXzxHCEhk9Aa3z/gSd1VFR5AJXytUkHiri8HSWpwPkLTDgot5sgibr4gRy640BfmYxfiHIh5ZCZNBJc+G7wjcVNDR02xfCzdF/yndL1d2SpiM54vY/ihn7qHVFjgB4P2SmQg03MS6UEUED+jJ7cxjcfxDS5FEghLLAqzyk+Y0r9DCSV1c2lz/UulyDglritzC1dfV1mp7LAxvH0bbbBHSOc0E3lJH42jTt3oD1U+AReoiBGhvS7GZeUGLGhMUlIuZJzyFhKGp/E98AGw57VrIDgECWx4BSjMAqj2X/VbMShxFPwiBBEAimBHXtNYONBotY3JohWmxpNw0UTQfnlDCJIehnbhKSa79MDBCx6+qAF6cBmy3iRTVjCFJg4kqkDkPvgdXv4sL+RGTzrXvchsKETRMJXpyowNkwv7QuquU4NyyZVf0soDrLSy3VyYFjS4h+3ikhOuPi8rrhNKlUyNurp5cV2plmIYEpCJr29bnW5WeraeF3j/v9qrft78uyVXf7+R8FIwYryGGsF61wfrjSJx4dR1jNFcVSsmt26//p1VNiaXCQVws0Hj4zsWZOFqs/ctIIHh6Dokr26MkbqNE0/CAuOlIpTMouiTbVAPUK+kM5haUKApqu/9X8SCD2hFkOdwBx6KR78yPqruXJ1VluK9k2g+6Xd+3ez9riGqIw04SCk0xGsapjfPSiljajut6+OrcJFQnHS0vA81QiejgCy5xE71MWQDOH3u7v4+7Ov7v/c7tbO5z/mp0j6WAsR7iOPFPxNe8PI6ViU5h7ip/BA0HM8b6YcGy79cYdSjiJCSkWyUYjMpWQWC0szAQ3pIxzv/LQ+1GGXgQ/ZFOWex2nclvOQsFFTR2ZiiIvKqA8fTyeFpoilhcCkdaQaRF2u4zwWh9Zk/7rnEpiKdr0xdm57yt57xgxfYqKaQtbUj0z0FKbZnBo66HSejW7OV362GK4GjbelVBMdvV9o2v1L+kM9JeuzjtAZmzi+QC0ZD4kOLhTZlMb60aKWmrQTPmh8jKFp5APAOJUYJJlncdqKNwZGBJLdXRoWoRiRYI3FxM2aNMD0I8gQPAsCONweD5v7bK6ROYGdMOhVLWDRCQwT155MLp6BieyuYCJCcEOmHMAnDiP6zY8229IPDUT4oeO2HGiUOyqU6D6b7XgYgJhl6lIuSgxr9RbGYm66k4ag8zlJ9iA500Jj1lCMLvxbiXB39D9G8Jx3ocMPiSwmjOhykgXcOVpZNB+I9Sxcc+EvLeIh4AHKxoSotKiEabxb3f1Zc8jLv/qT1znff+J+48nFMUvxbV8s0AsyRAevD4AQCOXfcSKd3dZJLNVlvPt4Q6teQ59QUIYGFpGychklr2uYqwTL5+Sqc+Dqp6erYJbZ2Hvm5iLr8HLG0R5/BlRmW0WfbbHGh7GuQ2J1f7z1uuEMDsT/h1Q0QxwKrxYbDYz0gE5XiaWOpqTLA48Nrv1zk5MWBfO54DkYxrmRAfss8D/JJgIEhpWUaOpSg7Hwz++rIxqUn1GFArXyK1Al/AYiGoMoPuRGw0DyN5VDS0cEMwTOIZxvgQhzCcQs5pdCj3F9BJcfzDNbErPZGagVbpmfJL+ghscZb1pp/ZCYbqmM08Th1vkQmdKeP/8yPBcg8SK/S3uKBPxTyTV15SuFZmq4ZOQ0k1ffwUvgcPRmfCD/NkJjsLEVe2mtq6+qf4Gxnf1U+Jamqrr7r9+NW5SgKqtCO8mTRqb7zvQSur5b1hYbSu79WSn08+dmDYoPve0Z7mUPqUmofZ87f0vxeVQCdVOaVrnIXIABS6dvY1QKuVXP7wYBw14ua7V6KPQcQfd/fSYD3v1tW9yJe'))
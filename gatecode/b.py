@@ -13,12 +13,6 @@ _ECD_COMMENT_SIZE = 7
 ECD_COMMENT_ = 8
 ECD_LOCATION_ = 9
 
-# The "central directory" structure, magic number, size, and indices
-# of entries in the structure (section V.F in the format document)
-structCentralDir = "<4s4B4HL2L5H2L"
-stringCentralDir = b"PK\001\002"
-sizeCentralDir = struct.calcsize(structCentralDir)
-
 # indexes of entries in the central directory structure
 CD_SIGNATURE_ = 0
 _CD_CREATE_VERSION = 1
@@ -40,6 +34,20 @@ _CD_INTERNAL_FILE_ATTRIBUTES = 16
 _CD_EXTERNAL_FILE_ATTRIBUTES = 17
 _CD_LOCAL_HEADER_OFFSET = 18
 
+# indexes of entries in the local file header structure
+_FH_SIGNATURE = 0
+_FH_EXTRACT_VERSION = 1
+_FH_EXTRACT_SYSTEM = 2
+_FH_GENERAL_PURPOSE_FLAG_BITS = 3
+_FH_COMPRESSION_METHOD = 4
+_FH_LAST_MOD_TIME = 5
+_FH_LAST_MOD_DATE = 6
+_FH_CRC = 7
+_FH_COMPRESSED_SIZE = 8
+_FH_UNCOMPRESSED_SIZE = 9
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+
 _MASK_ENCRYPTED = 1 << 0
 _MASK_COMPRESS_OPTION_1 = 1 << 1
 _MASK_COMPRESS_OPTION_2 = 1 << 2
@@ -71,6 +79,19 @@ _CD64_DIRECTORY_SIZE = 8
 _CD64_OFFSET_START_CENTDIR = 9
 _DD_SIGNATURE = 0x08074b50
 _EXTRA_FIELD_STRUCT = struct.Struct('<HH')
+_CENTRAL_DIR_STRUCT = struct.Struct(structCentralDir)
+_WZ_AES_EXTRA_STRUCT = struct.Struct('<3H2sBH')
+# The central directory is written out in pieces of about this size.
+_CENTRAL_DIR_FLUSH_SIZE = 1 << 20
+
+# Journal kept next to an archive by compact(): magic, final file length
+# and entry count, then every entry as (offset, size) and its bytes, then
+# the CRC-32 of everything before it.
+_COMPACT_JOURNAL_SUFFIX = '.compact'
+_COMPACT_JOURNAL_MAGIC = b'GCJ1'
+_COMPACT_JOURNAL_HEADER = struct.Struct('<4sQL')
+_COMPACT_JOURNAL_ENTRY = struct.Struct('<QQ')
+_COMPACT_JOURNAL_CRC = struct.Struct('<L')
 
 
 class ZipFile:
@@ -79,11 +100,58 @@ class ZipFile:
     zipinfo_cls = ZipInfo
     zipextfile_cls = ZipExtFile
     zipwritefile_cls = ZipWriteFile_
+    spillwritefile_cls = SpillWriteFile_
+    # Writes smaller than this are coalesced before they are compressed,
+    # encrypted and written out.  0 passes every write straight through.
+    write_buffer_size = 64 * 1024
+    # Bytes from the start of a member handed to compression_policy.
+    compression_sample_size = 64 * 1024
+    # Members whose central directory entry declares more than this many
+    # uncompressed bytes, or more than this many per compressed byte, are
+    # refused before anything is decompressed.  None for no limit.
+    max_member_size = None
+    max_expansion_ratio = None
+    # Uncompressed bytes, as declared, that all the members read from one
+    # ZipFile may add up to; reads past it are refused.  None for no limit.
+    max_total_output = None
+    # read_many() joins the records of neighbouring members into reads of
+    # up to this many bytes, across gaps of up to read_many_gap bytes.
+    read_many_block_size = 8 << 20
+    read_many_gap = 64 * 1024
 
     def __init__(self, file, mode="r", compression=ZIP_STORED, allowZip64=True,
-                 compresslevel=None, *, strict_timestamps=True):
+                 compresslevel=None, *, strict_timestamps=True,
+                 compress_workers=None, concurrent_writes=False,
+                 compression_policy=None, collect_stats=False,
+                 stats_callback=None, content_cache_size=0):
         """Open the ZIP file with mode read 'r', write 'w', exclusive create
-        'x', or append 'a'."""
+        'x', or append 'a'.
+
+        With compress_workers > 1, deflate and bzip2 members are compressed
+        in independent blocks on that many threads.  The result is a single
+        standard stream for each member, slightly larger than a sequential
+        one.
+
+        With concurrent_writes, any number of open(name, 'w') handles may be
+        live at once, from any thread.  Each compresses into its own spool
+        and the member is appended to the archive in one piece when the
+        handle is closed; a handle left by an exception is dropped.
+
+        compression_policy is called as policy(zinfo, sample) for members
+        added by write(), writestr() and write_many() without an explicit
+        compress_type, with the first compression_sample_size bytes of the
+        member.  It returns a (compress_type, compresslevel) pair to use
+        instead of the archive's setting, or None to keep it; see
+        default_compression_policy().  The outcome for each such member is
+        kept in compression_stats.
+
+        With collect_stats, or a stats_callback, the archive counts the I/O
+        and crypto work done for it; see stats().
+
+        With content_cache_size, read() keeps the contents of the members it
+        returns, up to that many bytes in all, and hands the same bytes out
+        again while the member is unchanged; see cache_stats() and
+        invalidate()."""
         if mode not in ('r', 'w', 'x', 'a'):
             raise ValueError("ZipFile requires mode 'r', 'w', 'x', or 'a'")
 
@@ -96,6 +164,20 @@ class ZipFile:
         self.filelist = []  # List of ZipInfo instances for archive
         self.compression = compression  # Method of compression
         self.compresslevel = compresslevel
+        self.compress_workers = compress_workers
+        self.concurrent_writes = concurrent_writes
+        self.compression_policy = compression_policy
+        self.compression_stats = {}
+        self._open_spills = 0
+        self._total_output = 0
+        if collect_stats or stats_callback is not None:
+            self._stats = Counters_(ZIP_STATS, stats_callback)
+        else:
+            self._stats = None
+        if content_cache_size:
+            self._content_cache = ContentCache_(content_cache_size)
+        else:
+            self._content_cache = None
         self.mode = mode
         self.pinyin = None
         self.encryption = None
@@ -137,6 +219,7 @@ class ZipFile:
         self._writing = False
 
         try:
+            self._finish_compact()
             if mode == 'r':
                 self._RealGetContents()
             elif mode in ('w', 'x'):
@@ -146,7 +229,7 @@ class ZipFile:
                 try:
                     self.start_dir = self.fp.tell()
                 except (AttributeError, OSError):
-                    self.fp = _Tellable(self.fp)
+                    self.fp = Tellable_(self.fp)
                     self.start_dir = 0
                     self._seekable = False
                 else:
@@ -155,6 +238,7 @@ class ZipFile:
                         self.fp.seek(self.start_dir)
                     except (AttributeError, OSError):
                         self._seekable = False
+                self._data_start = self.start_dir
             elif mode == 'a':
                 try:
                     # See if file is a zip file
@@ -168,7 +252,7 @@ class ZipFile:
                     # set the modified flag so central directory gets written
                     # even if no files are added to the archive
                     self._didModify = True
-                    self.start_dir = self.fp.tell()
+                    self.start_dir = self._data_start = self.fp.tell()
             else:
                 raise ValueError("Mode must be 'r', 'w', 'x', or 'a'")
         except Exception as e:
@@ -274,6 +358,15 @@ class ZipFile:
             if self.debug > 2:
                 print("total", total)
 
+        # Where member data starts, for compact(): the first record, or the
+        # start of the archive proper if an earlier remove() left a gap there.
+        self._data_start = min((x.header_offset for x in self.filelist),
+                               default=self.start_dir)
+        if concat < self._data_start:
+            self.fp.seek(concat)
+            if self.fp.read(4) == stringFileHeader:
+                self._data_start = concat
+
     def namelist(self):
         """Return a list of file names in the archive."""
         return [data.filename for data in self.filelist]
@@ -314,6 +407,38 @@ class ZipFile:
 
         return info
 
+    def stats(self):
+        """Return a dict snapshot of the counters named in ZIP_STATS.
+
+        Bytes are counted as read from the archive, as decrypted and as
+        decompressed; seeks counts the times a read handle had to move the
+        archive file, and lock_wait_seconds is the time read handles spent
+        waiting for each other.  The dict is empty unless the archive was
+        opened with collect_stats or a stats_callback, which is called as
+        callback(name, increment) on every update.
+        """
+        if self._stats is None:
+            return {}
+        return self._stats.snapshot()
+
+    def cache_stats(self):
+        """Return the counters of the content cache, named in CACHE_STATS,
+        with its current entries and bytes; empty without a cache."""
+        if self._content_cache is None:
+            return {}
+        return self._content_cache.stats()
+
+    def invalidate(self, name=None):
+        """Drop the cached contents of the member name, or of every member."""
+        if self._content_cache is None:
+            return
+        if isinstance(name, ZipInfo):
+            name = name.filename
+        if name is None:
+            self._content_cache.invalidate()
+        else:
+            self._content_cache.invalidate(lambda key: key[0] == name)
+
     def setpassword(self, pinyin):
         """Set default password for encrypted files."""
         if pinyin and not isinstance(pinyin, bytes):
@@ -327,7 +452,7 @@ class ZipFile:
         self.encryption = encryption
         self.encryption_kwargs = kwargs
 
-    def get_encrypter(self):
+    def get_encrypter(self, pinyin=None):
         raise NotImplementedError("That encryption method is not supported")
 
     @property
@@ -352,35 +477,230 @@ class ZipFile:
 
     def read(self, name, pinyin=None):
         """Return file bytes (as a string) for name."""
-        with self.open(name, "r", pinyin) as fp:
-            return fp.read()
+        if self._content_cache is None:
+            with self.open(name, "r", pinyin) as fp:
+                return fp.read()
+        zinfo = name if isinstance(name, ZipInfo) else self.getinfo(name)
+        key = self._cache_key(zinfo, pinyin)
+        data = self._content_cache.get(key)
+        if data is None:
+            with self.open(zinfo, "r", pinyin) as fp:
+                data = bytes(fp.read())
+            self._content_cache.put(key, data)
+        return data
+
+    def _cache_key(self, zinfo, pinyin):
+        # A rewritten member has a new offset, and usually a new CRC.
+        key = (zinfo.filename, zinfo.header_offset, zinfo.CRC)
+        if zinfo.is_encrypted:
+            # Only handed out again for the password that decrypted it.
+            key += (pinyin or self.pinyin,)
+        return key
+
+    def read_many(self, names, pinyin=None, max_workers=None,
+                  max_inflight=64 << 20):
+        """Read the members names, yielding (name, bytes) pairs as each one
+        is ready; dict(zf.read_many(names)) collects them all.
+
+        The records are read in the order they are stored, neighbours joined
+        into reads of up to read_many_block_size bytes, and decrypted and
+        decompressed on up to max_workers threads.  No read starts while the
+        compressed and uncompressed sizes of the members read but not yet
+        yielded add up to more than max_inflight bytes, though there is
+        always at least one read in flight.  A member named more than once
+        is read once and yielded once for every time it is named.
+        """
+        if not self.fp:
+            raise ValueError(
+                "Attempt to read ZIP archive that was already closed")
+        from concurrent.futures import (FIRST_COMPLETED, ThreadPoolExecutor,
+                                        wait)
+
+        if not pinyin:
+            pinyin = self.pinyin
+        if pinyin and not isinstance(pinyin, bytes):
+            raise TypeError("pinyin: expected bytes, got %s"
+                            % type(pinyin).__name__)
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        zinfos = {}
+        # id of each member -> number of times it was named
+        repeats = collections.Counter()
+        for name in names:
+            zinfo = name if isinstance(name, ZipInfo) else self.getinfo(name)
+            self._check_expansion(zinfo)
+            zinfos[id(zinfo)] = zinfo
+            repeats[id(zinfo)] += 1
+        todo = []
+        for zinfo in zinfos.values():
+            data = None
+            if self._content_cache is not None:
+                data = self._content_cache.get(self._cache_key(zinfo, pinyin))
+            if data is not None:
+                for _ in range(repeats[id(zinfo)]):
+                    yield zinfo.filename, data
+            else:
+                todo.append(zinfo)
+        todo.sort(key=lambda zinfo: zinfo.header_offset)
+        for zinfo in todo:
+            self._charge_output(zinfo)
+
+        # Future of each member being decoded -> (bytes it holds in flight,
+        # member)
+        pending = {}
+        inflight = 0
+        with ThreadPoolExecutor(max_workers) as pool:
+            try:
+                for start, end, group in self._record_runs(todo):
+                    cost = end - start + sum(zinfo.file_size
+                                             for zinfo in group)
+                    while pending and inflight + cost > max_inflight:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            held, zinfo = pending.pop(future)
+                            inflight -= held
+                            for _ in range(repeats[id(zinfo)]):
+                                yield future.result()
+                    data = self._read_records(start, end)
+                    # The members of a run share the cost of the read.
+                    share, extra = divmod(end - start, len(group))
+                    for zinfo in group:
+                        future = pool.submit(self._decode_record, data, start,
+                                             zinfo, pinyin)
+                        held = share + extra + zinfo.file_size
+                        pending[future] = held, zinfo
+                        inflight += held
+                        extra = 0
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        held, zinfo = pending.pop(future)
+                        inflight -= held
+                        for _ in range(repeats[id(zinfo)]):
+                            yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _record_runs(self, zinfos):
+        # Group zinfos, sorted by offset, into (start, end, members) runs
+        # read with one request each.  A record ends where the next one, or
+        # the central directory, starts.
+        import bisect
+
+        offsets = sorted(zinfo.header_offset for zinfo in self.filelist)
+        group = []
+        start = end = 0
+        for zinfo in zinfos:
+            i = bisect.bisect_right(offsets, zinfo.header_offset)
+            record_end = offsets[i] if i < len(offsets) else self.start_dir
+            if group and (zinfo.header_offset - end > self.read_many_gap or
+                          record_end - start > self.read_many_block_size):
+                yield start, end, group
+                group = []
+            if not group:
+                start = zinfo.header_offset
+            group.append(zinfo)
+            end = max(end, record_end)
+        if group:
+            yield start, end, group
+
+    def _read_records(self, start, end):
+        self._fileRefCnt += 1
+        fp = SharedFile_(self.fp, start, self._fpclose, self._lock,
+                         lambda: self._writing, self._stats)
+        try:
+            return fp.read(end - start)
+        finally:
+            fp.close()
+
+    def _decode_record(self, data, start, zinfo, pinyin):
+        # Runs on a worker thread, on the bytes from _read_records().
+        fp = _RecordBuffer(data, self._stats)
+        fp.seek(zinfo.header_offset - start)
+        with self.zipextfile_cls(fp, 'r', zinfo, False, pinyin) as zef:
+            content = bytes(zef.read())
+        if self._content_cache is not None:
+            self._content_cache.put(self._cache_key(zinfo, pinyin), content)
+        return zinfo.filename, content
 
     def open(self, name, mode="r", pinyin=None, *, force_zip64=False):
         from .u import open_
         return open_(self, name, mode, pinyin=pinyin, force_zip64=force_zip64)
 
+    def _check_expansion(self, zinfo):
+        # Decompression never yields more than the declared file_size, so
+        # checking the central directory entry is enough.
+        if self.max_member_size is not None and \
+                zinfo.file_size > self.max_member_size:
+            raise BadZipFile(
+                "File %r expands to %d bytes, more than max_member_size"
+                % (zinfo.filename, zinfo.file_size))
+        if self.max_expansion_ratio is not None and zinfo.file_size and \
+                zinfo.file_size > \
+                self.max_expansion_ratio * max(zinfo.compress_size, 1):
+            raise BadZipFile(
+                "File %r expands %d bytes to %d, more than "
+                "max_expansion_ratio" % (zinfo.filename, zinfo.compress_size,
+                                         zinfo.file_size))
+
+    def _charge_output(self, zinfo):
+        # Called for every member about to be decompressed; contents served
+        # from the content cache cost nothing.
+        if self.max_total_output is None:
+            return
+        with self._lock:
+            total = self._total_output + zinfo.file_size
+            if total > self.max_total_output:
+                raise BadZipFile(
+                    "File %r takes the output of the archive to %d bytes, "
+                    "more than max_total_output" % (zinfo.filename, total))
+            self._total_output = total
+
     def _open_to_read(self, mode, zinfo, pinyin):
         # Open for reading:
+        self._check_expansion(zinfo)
+        self._charge_output(zinfo)
         self._fileRefCnt += 1
         zef_file = SharedFile_(self.fp, zinfo.header_offset,
-                               self._fpclose, self._lock, lambda: self._writing)
+                               self._fpclose, self._lock, lambda: self._writing,
+                               self._stats)
         try:
             return self.zipextfile_cls(zef_file, mode, zinfo, True, pinyin)
         except Exception as e:
             zef_file.close()
             raise e
 
-    def _open_to_write(self, zinfo, force_zip64=False, pinyin=None):
+    def _open_to_write(self, zinfo, force_zip64=False, pinyin=None,
+                       encrypter=None):
         if force_zip64 and not self._allowZip64:
             raise ValueError(
                 "force_zip64 is True, but allowZip64 was False when opening "
                 "the ZIP file."
             )
+        if self.concurrent_writes:
+            encrypter = self._init_write(zinfo, pinyin, encrypter)
+            return self.spillwritefile_cls(self, zinfo, force_zip64, encrypter,
+                                           autocommit=True)
         if self._writing:
             raise ValueError("Can't write to the ZIP file while there is "
                              "another write handle open on it. "
                              "Close the first handle before opening another.")
 
+        encrypter = self._init_write(zinfo, pinyin, encrypter)
+
+        # Compressed size can be larger than uncompressed size
+        zip64 = self._allowZip64 and \
+                (force_zip64 or zinfo.file_size * 1.05 > ZIP64_LIMIT)  # noqa: E127
+
+        if self._seekable:
+            self.fp.seek(self.start_dir)
+        zinfo.header_offset = self.fp.tell()
+
+        self._writecheck(zinfo)
+        return self.zipwritefile_cls(self, zinfo, zip64, encrypter)
+
+    def _init_write(self, zinfo, pinyin, encrypter=None):
         # Sizes and CRC are overwritten with correct data after processing the
         # file
         if not hasattr(zinfo, 'file_size'):
@@ -389,11 +709,15 @@ class ZipFile:
         zinfo.CRC = 0
 
         zinfo.flag_bits = 0x00
-        encrypter = None
-        if pinyin is not None or self.encryption is not None:
+        if encrypter is None and (pinyin is not None or
+                                  self.encryption is not None):
+            encrypter = self.get_encrypter(pinyin)
+        if encrypter is not None:
             zinfo.flag_bits |= _MASK_ENCRYPTED
-            encrypter = self.get_encrypter()
             encrypter.update_zipinfo(zinfo)
+            if self._stats is not None and \
+                    isinstance(encrypter, AESZipEncrypter):
+                self._stats.add('kdf_calls')
         if zinfo.compress_type == ZIP_LZMA:
             # Compressed data includes an end-of-stream (EOS) marker
             zinfo.flag_bits |= _MASK_COMPRESS_OPTION_1
@@ -402,17 +726,461 @@ class ZipFile:
 
         if not zinfo.external_attr:
             zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+        return encrypter
 
-        # Compressed size can be larger than uncompressed size
-        zip64 = self._allowZip64 and \
-                (force_zip64 or zinfo.file_size * 1.05 > ZIP64_LIMIT)  # noqa: E127
+    def _open_to_spill(self, zinfo, force_zip64=False, pinyin=None):
+        # Like _open_to_write, but the member is compressed into a spool file
+        # and only added to the archive by the handle's commit().  Safe to
+        # call from several threads at once.
+        if force_zip64 and not self._allowZip64:
+            raise ValueError(
+                "force_zip64 is True, but allowZip64 was False when opening "
+                "the ZIP file."
+            )
+        encrypter = self._init_write(zinfo, pinyin)
+        return self.spillwritefile_cls(self, zinfo, force_zip64, encrypter)
 
-        if self._seekable:
+    def _spill_file(self, filename, arcname, compress_type, compresslevel):
+        zinfo = self.zipinfo_cls.from_file(
+            filename, arcname, strict_timestamps=self._strict_timestamps)
+        if zinfo.is_dir():
+            # Directories are stored bare, as by write().
+            dest = self.spillwritefile_cls(self, zinfo, False)
+            dest.close()
+            return dest
+        if compress_type is not None:
+            zinfo.compress_type = compress_type
+        else:
+            zinfo.compress_type = self.compression
+        if compresslevel is not None:
+            zinfo._compresslevel = compresslevel
+        else:
+            zinfo._compresslevel = self.compresslevel
+        with open(filename, "rb") as src:
+            sample = self._sample_file(src, zinfo, compress_type)
+            with self._open_to_spill(zinfo) as dest:
+                dest.write(sample)
+                shutil.copyfileobj(src, dest, 1024 * 1024)
+        self._record_compression(zinfo, compress_type)
+        return dest
+
+    def _sample_file(self, src, zinfo, compress_type):
+        # Read the start of src for compression_policy, if it is to be asked.
+        if compress_type is not None or self.compression_policy is None:
+            return b''
+        sample = src.read(self.compression_sample_size)
+        self._choose_compression(zinfo, sample)
+        return sample
+
+    def _choose_compression(self, zinfo, sample):
+        choice = self.compression_policy(zinfo, sample)
+        if choice is not None:
+            check_compression_(choice[0])
+            zinfo.compress_type, zinfo._compresslevel = choice
+
+    def _record_compression(self, zinfo, compress_type):
+        if compress_type is None and self.compression_policy is not None:
+            self.compression_stats[zinfo.filename] = {
+                'compress_type': zinfo.compress_type,
+                'compresslevel': zinfo._compresslevel,
+                'file_size': zinfo.file_size,
+                'compress_size': zinfo.compress_size,
+            }
+
+    def write_many(self, files, compress_type=None, compresslevel=None,
+                   max_workers=None, max_pending=None):
+        """Put many files into the archive, compressing them concurrently.
+
+        files yields filenames or (filename, arcname) pairs.  Up to
+        max_workers members are compressed and encrypted at once, each into
+        a spool file, and at most max_pending finished or running members
+        are held before the oldest one is appended.  Members are appended in
+        the order given, so the archive does not depend on scheduling.
+        """
+        if not self.fp:
+            raise ValueError(
+                "Attempt to write to ZIP archive that was already closed")
+        if self._writing:
+            raise ValueError(
+                "Can't write to ZIP archive while an open writing handle exists"
+            )
+        from concurrent.futures import ThreadPoolExecutor
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_pending is None:
+            max_pending = 2 * max_workers
+        pending = collections.deque()
+        with ThreadPoolExecutor(max_workers) as pool:
+            try:
+                for item in files:
+                    if isinstance(item, (str, bytes, os.PathLike)):
+                        filename, arcname = item, None
+                    else:
+                        filename, arcname = item
+                    pending.append(pool.submit(
+                        self._spill_file, filename, arcname, compress_type,
+                        compresslevel))
+                    if len(pending) >= max_pending:
+                        pending.popleft().result().commit()
+                while pending:
+                    pending.popleft().result().commit()
+            except BaseException:
+                for future in pending:
+                    if not future.cancel() and future.exception() is None:
+                        future.result().discard()
+                raise
+
+    def write_tree(self, path, arcname=None, **kwargs):
+        """Put the directory tree at path into the archive under arcname.
+
+        Entries are added depth first in sorted order; symlinked
+        directories are not followed.  Keyword arguments are passed on to
+        write_many().
+        """
+        if arcname is None:
+            arcname = os.path.basename(os.path.normpath(path))
+        self.write_many(_walk_tree(path, arcname), **kwargs)
+
+    def _member_span(self, zinfo):
+        """Return the start and end offsets of the record of zinfo.
+
+        The record is the local file header, the encryption header, the
+        compressed data and the data descriptor, if any.
+        """
+        self.fp.seek(zinfo.header_offset)
+        fheader = self.fp.read(sizeFileHeader)
+        if len(fheader) != sizeFileHeader:
+            raise BadZipFile("Truncated file header")
+        fheader = struct.unpack(structFileHeader, fheader)
+        if fheader[_FH_SIGNATURE] != stringFileHeader:
+            raise BadZipFile("Bad magic number for file header")
+        self.fp.read(fheader[_FH_FILENAME_LENGTH])
+        extra = self.fp.read(fheader[_FH_EXTRA_FIELD_LENGTH])
+        end = self.fp.tell() + zinfo.compress_size
+        if zinfo.flag_bits & _MASK_USE_DATA_DESCRIPTOR:
+            # The descriptor has 8 byte sizes when the header has a ZIP64
+            # extra block.
+            zip64 = False
+            i = 0
+            while i + 4 <= len(extra):
+                xid, xlen = _EXTRA_FIELD_STRUCT.unpack_from(extra, i)
+                zip64 = zip64 or xid == EXTRA_ZIP64
+                i += 4 + xlen
+            self.fp.seek(end)
+            sig = self.fp.read(4)
+            if len(sig) == 4 and struct.unpack('<L', sig)[0] == _DD_SIGNATURE:
+                end += 4
+            end += 20 if zip64 else 12
+        return zinfo.header_offset, end
+
+    def _copy_raw_member(self, src, zinfo):
+        """Append the record of zinfo from the ZipFile src verbatim.
+
+        Nothing is decrypted or decompressed; only the offset recorded in the
+        central directory changes.
+        """
+        if self._writing:
+            raise ValueError("Can't write to ZIP archive while an open "
+                             "writing handle exists")
+        # The record is read from src and written to self as one piece, so
+        # both locks are held; they are taken in the order of their ids, so
+        # copies running the other way between the same two archives cannot
+        # deadlock.
+        first, second = sorted((src._lock, self._lock), key=id)
+        with first, second:
+            start, end = src._member_span(zinfo)
+            new = raw_zipinfo_(zinfo)
+            if self._seekable:
+                self.fp.seek(self.start_dir)
+            new.header_offset = self.fp.tell()
+            self._writecheck(new)
+            self._didModify = True
+            copy_range_(src.fp, start, end - start, self.fp)
+            self.start_dir = self.fp.tell()
+            self.filelist.append(new)
+            self.NameToInfo[new.filename] = new
+        return new
+
+    def _check_modify(self, action):
+        if self.mode not in ('w', 'x', 'a'):
+            raise ValueError("%s() requires mode 'w', 'x', or 'a'" % action)
+        if not self.fp:
+            raise ValueError(
+                "Attempt to modify ZIP archive that was already closed")
+        if self._writing or self._open_spills:
+            raise ValueError("Can't modify the ZIP archive while an open "
+                             "writing handle exists")
+
+    def remove(self, name):
+        """Remove the member name, or the ZipInfo name, from the archive.
+
+        Only the entry is dropped from the central directory written at
+        close; the record stays in the file as a gap until compact() is run.
+        """
+        self._check_modify('remove')
+        zinfo = name if isinstance(name, ZipInfo) else self.getinfo(name)
+        with self._lock:
+            self.filelist.remove(zinfo)
+            self._forget(zinfo)
+            self._didModify = True
+        self.invalidate(zinfo.filename)
+
+    def _forget(self, zinfo):
+        if self.NameToInfo.get(zinfo.filename) is zinfo:
+            del self.NameToInfo[zinfo.filename]
+            for other in reversed(self.filelist):
+                if other.filename == zinfo.filename:
+                    self.NameToInfo[other.filename] = other
+                    break
+
+    def replace(self, name, data, compress_type=None, compresslevel=None,
+                pinyin=None):
+        """Replace the contents of the member name with data.
+
+        The new record is appended like writestr() does, keeping the
+        compression and attributes of the old member unless compress_type is
+        given; the old record is left as a gap for compact().  The old entry
+        is kept if writing the new one fails.
+
+        An encrypted member is encrypted again with the same WinZip AES key
+        strength, whatever the archive's own encryption setting, and needs
+        its password: pinyin, or the archive's.  RuntimeError is raised
+        without one, and NotImplementedError for members encrypted some
+        other way, which cannot be written; data is never stored in the
+        clear in place of encrypted contents.
+        """
+        self._check_modify('replace')
+        old = self.getinfo(name)
+        if compress_type is None:
+            compress_type = old.compress_type
+        encrypter = None
+        if old.flag_bits & _MASK_ENCRYPTED:
+            encrypter = self._reencrypter(old, pinyin)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        zinfo = self.zipinfo_cls(filename=old.filename,
+                                 date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = compress_type
+        zinfo._compresslevel = self.compresslevel if compresslevel is None \
+            else compresslevel
+        zinfo.external_attr = old.external_attr
+        zinfo.file_size = len(data)
+        with self._lock:
+            # Hide the old entry from _writecheck's duplicate name warning.
+            del self.NameToInfo[old.filename]
+            try:
+                with self._open_to_write(zinfo, encrypter=encrypter) as dest:
+                    dest.write(data)
+            except BaseException:
+                self.NameToInfo.setdefault(old.filename, old)
+                raise
+            self.filelist.remove(old)
+            self._forget(old)
+        self.invalidate(old.filename)
+
+    def _reencrypter(self, zinfo, pinyin):
+        # The encrypter for the contents that replace the encrypted member
+        # zinfo, once its password is known to be the right one.
+        strength = getattr(zinfo, 'wz_aes_strength', None)
+        if strength is None:
+            raise NotImplementedError(
+                "Can't replace %r: only WinZip AES members can be encrypted"
+                % zinfo.filename)
+        pinyin = pinyin or self.pinyin
+        if not pinyin:
+            raise RuntimeError("File %r is encrypted, password required to "
+                               "replace it" % zinfo.filename)
+        # Raises RuntimeError for a wrong password.
+        with self.open(zinfo, 'r', pinyin):
+            pass
+        nbits = {1: 128, 2: 192, 3: 256}[strength]
+        return AESZipEncrypter(pinyin, nbits=nbits)
+
+    def compact(self, budget=None):
+        """Close the gaps left by remove() and replace().
+
+        Member records are slid towards the start of the file with raw
+        copies, so nothing is decompressed or decrypted.  At most budget
+        bytes of records are moved per call, though always at least one
+        record, after which a central directory is written and the file is
+        truncated, so the archive is complete between calls and the job
+        can be resumed later, from this or another ZipFile.  Returns True
+        once no gaps are left.
+
+        Before anything is moved, the records to move and the new central
+        directory are saved to a journal next to the archive, named after
+        it with a .compact suffix, which is removed once the call is done.
+        A call that is interrupted is finished from the journal when the
+        archive is next opened in 'a' mode; opening it in 'r' mode raises
+        BadZipFile until then.  Archives opened from a file object without
+        a file name keep no journal, and an interrupted call leaves them
+        without a valid central directory.
+        """
+        self._check_modify('compact')
+        if not self._seekable:
+            raise ValueError("compact() requires a seekable file")
+        with self._lock:
+            spans = sorted((self._member_span(zinfo) + (zinfo,)
+                            for zinfo in self.filelist),
+                           key=lambda span: span[0])
+            pos = self._data_start
+            moves = []
+            moved = 0
+            done = True
+            for start, end, zinfo in spans:
+                size = end - start
+                if start != pos:
+                    if budget is not None and moved and moved + size > budget:
+                        done = False
+                        break
+                    moves.append((start, size, pos, zinfo))
+                    moved += size
+                pos += size
+            old_offsets = [(zinfo, zinfo.header_offset)
+                           for _, _, _, zinfo in moves]
+            old_start_dir = self.start_dir
+            for start, size, dest, zinfo in moves:
+                zinfo.header_offset = dest
+            if done:
+                self.start_dir = pos
+            try:
+                end_record = self._encode_end_record()
+                journal = self._compact_journal_path()
+                if journal is not None:
+                    self._write_compact_journal(journal, moves, end_record)
+            except BaseException:
+                # Nothing has been moved yet.
+                for zinfo, offset in old_offsets:
+                    zinfo.header_offset = offset
+                self.start_dir = old_start_dir
+                raise
+            # Cached contents are keyed by offset.
+            self.invalidate()
+            self._didModify = True
+            for start, size, dest, zinfo in moves:
+                self._move_record(start, size, dest)
             self.fp.seek(self.start_dir)
-        zinfo.header_offset = self.fp.tell()
+            self.fp.write(end_record)
+            self.fp.truncate()
+            self.fp.flush()
+            if journal is not None:
+                os.fsync(self.fp.fileno())
+                os.remove(journal)
+            self.fp.seek(self.start_dir)
+        return done
 
-        self._writecheck(zinfo)
-        return self.zipwritefile_cls(self, zinfo, zip64, encrypter)
+    def _encode_end_record(self):
+        # Return the central directory and end records as written at
+        # start_dir, without touching the file.
+        fp = self.fp
+        self.fp = _OffsetBuffer(self.start_dir)
+        try:
+            self._write_end_record()
+            return self.fp.getvalue()
+        finally:
+            self.fp = fp
+
+    def _compact_journal_path(self):
+        if isinstance(self.filename, (str, bytes, os.PathLike)):
+            return os.fsdecode(self.filename) + _COMPACT_JOURNAL_SUFFIX
+        return None
+
+    def _write_compact_journal(self, path, moves, end_record):
+        # The journal is complete once it has its name; the record bytes are
+        # copied in chunks, so at most one chunk is held in memory.
+        tmp = path + '.tmp'
+        crc = 0
+        with open(tmp, 'wb') as out:
+            def write(data):
+                nonlocal crc
+                crc = crc32(data, crc)
+                out.write(data)
+            write(_COMPACT_JOURNAL_HEADER.pack(
+                _COMPACT_JOURNAL_MAGIC, self.start_dir + len(end_record),
+                len(moves) + 1))
+            for start, size, dest, zinfo in moves:
+                write(_COMPACT_JOURNAL_ENTRY.pack(dest, size))
+                done = 0
+                while done < size:
+                    self.fp.seek(start + done)
+                    data = self.fp.read(min(size - done, 1 << 20))
+                    if not data:
+                        raise BadZipFile("Truncated member record")
+                    write(data)
+                    done += len(data)
+            write(_COMPACT_JOURNAL_ENTRY.pack(self.start_dir,
+                                              len(end_record)))
+            write(end_record)
+            out.write(_COMPACT_JOURNAL_CRC.pack(crc))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, path)
+
+    def _finish_compact(self):
+        # Finish a compact() call that was interrupted, by writing every
+        # byte it was going to write again.  A new archive in the same place
+        # makes the journal stale.
+        path = self._compact_journal_path()
+        if path is None or not os.path.exists(path):
+            return
+        if self.mode in ('w', 'x'):
+            os.remove(path)
+            return
+        if self.mode != 'a':
+            raise BadZipFile("%r has an unfinished compact(); open it in "
+                             "mode 'a' to finish it" % self.filename)
+        with open(path, 'rb') as journal:
+            # Check the whole journal before writing any of it.
+            size = os.fstat(journal.fileno()).st_size - \
+                _COMPACT_JOURNAL_CRC.size
+            crc = 0
+            left = size
+            while left > 0:
+                data = journal.read(min(left, 1 << 20))
+                if not data:
+                    break
+                crc = crc32(data, crc)
+                left -= len(data)
+            trailer = journal.read(_COMPACT_JOURNAL_CRC.size)
+            if size < _COMPACT_JOURNAL_HEADER.size or left or \
+                    _COMPACT_JOURNAL_CRC.unpack(trailer)[0] != crc:
+                raise BadZipFile("Bad compact journal %r" % path)
+            journal.seek(0)
+            magic, length, count = _COMPACT_JOURNAL_HEADER.unpack(
+                journal.read(_COMPACT_JOURNAL_HEADER.size))
+            if magic != _COMPACT_JOURNAL_MAGIC:
+                raise BadZipFile("Bad magic number for compact journal %r"
+                                 % path)
+            for _ in range(count):
+                offset, size = _COMPACT_JOURNAL_ENTRY.unpack(
+                    journal.read(_COMPACT_JOURNAL_ENTRY.size))
+                self.fp.seek(offset)
+                while size > 0:
+                    data = journal.read(min(size, 1 << 20))
+                    if not data:
+                        raise BadZipFile("Truncated compact journal %r"
+                                         % path)
+                    self.fp.write(data)
+                    size -= len(data)
+        self.fp.truncate(length)
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        os.remove(path)
+
+    def _move_record(self, start, size, dest):
+        # Copy front to back: dest is below start, so each block is read
+        # before anything after it is overwritten.
+        done = 0
+        while done < size:
+            n = min(size - done, 1 << 20)
+            self.fp.seek(start + done)
+            data = self.fp.read(n)
+            if len(data) != n:
+                raise BadZipFile("Truncated member record")
+            self.fp.seek(dest + done)
+            self.fp.write(data)
+            done += n
 
     def extract(self, member, path=None, pinyin=None):
         """Extract a member from the archive to the current working directory,
@@ -578,8 +1346,12 @@ class ZipFile:
                 self.fp.write(zinfo.FileHeader(False))
                 self.start_dir = self.fp.tell()
         else:
-            with open(filename, "rb") as src, self.open(zinfo, 'w') as dest:
-                shutil.copyfileobj(src, dest, 1024 * 8)
+            with open(filename, "rb") as src:
+                sample = self._sample_file(src, zinfo, compress_type)
+                with self.open(zinfo, 'w') as dest:
+                    dest.write(sample)
+                    shutil.copyfileobj(src, dest, 1024 * 1024)
+            self._record_compression(zinfo, compress_type)
 
     def writestr(self, zinfo_or_arcname, data,
                  compress_type=None, compresslevel=None):
@@ -590,6 +1362,7 @@ class ZipFile:
         the name of the file in the archive."""
         if isinstance(data, str):
             data = data.encode("utf-8")
+        choose = False
         if not isinstance(zinfo_or_arcname, self.zipinfo_cls):
             zinfo = self.zipinfo_cls(
                 filename=zinfo_or_arcname,
@@ -601,6 +1374,8 @@ class ZipFile:
                 zinfo.external_attr |= 0x10  # MS-DOS directory flag
             else:
                 zinfo.external_attr = 0o600 << 16  # ?rw-------
+                choose = compress_type is None and \
+                    self.compression_policy is not None
         else:
             zinfo = zinfo_or_arcname
 
@@ -618,10 +1393,18 @@ class ZipFile:
         if compresslevel is not None:
             zinfo._compresslevel = compresslevel
 
+        if choose:
+            self._choose_compression(
+                zinfo, data[:self.compression_sample_size])
+
         zinfo.file_size = len(data)  # Uncompressed size
-        with self._lock:
+        # Concurrent handles only take the lock to append the finished member.
+        lock = contextlib.nullcontext() if self.concurrent_writes else self._lock
+        with lock:
             with self.open(zinfo, mode='w') as dest:
                 dest.write(data)
+        if choose:
+            self._record_compression(zinfo, None)
 
     def __del__(self):
         """Call the "close()" method in case the user forgot."""
@@ -633,7 +1416,7 @@ class ZipFile:
         if self.fp is None:
             return
 
-        if self._writing:
+        if self._writing or self._open_spills:
             raise ValueError("Can't close the ZIP file while there is "
                              "an open writing handle on it. "
                              "Close the writing handle before closing the zip.")
@@ -648,14 +1431,10 @@ class ZipFile:
             fp = self.fp
             self.fp = None
             self._fpclose(fp)
+            self.invalidate()
 
     def _write_end_record(self):
-        for zinfo in self.filelist:  # write central directory
-            centdir, filename, extra_data = zinfo.central_directory()
-            self.fp.write(centdir)
-            self.fp.write(filename)
-            self.fp.write(extra_data)
-            self.fp.write(zinfo.comment)
+        self._write_central_directory()
 
         pos2 = self.fp.tell()
         # Write end-of-zip-archive record
@@ -693,8 +1472,73 @@ class ZipFile:
                              centDirSize, centDirOffset, len(self._comment))
         self.fp.write(endrec)
         self.fp.write(self._comment)
+        if self.mode == "a":
+            self.fp.truncate()
         self.fp.flush()
 
+    def _write_central_directory(self):
+        # Same records as zinfo.central_directory() gives for each member.
+        # Plain ZipInfo and AESZipInfo entries that need no ZIP64 extra are
+        # encoded inline into one buffer; anything else, including
+        # subclasses that override the encoding, takes the general path.
+        buf = bytearray()
+        write = self.fp.write
+        pack = _CENTRAL_DIR_STRUCT.pack
+        for zinfo in self.filelist:
+            cls = type(zinfo)
+            if (cls is not ZipInfo and cls is not AESZipInfo) or \
+                    zinfo.file_size > ZIP64_LIMIT or \
+                    zinfo.compress_size > ZIP64_LIMIT or \
+                    zinfo.header_offset > ZIP64_LIMIT:  # noqa: E129
+                centdir, filename, extra_data = zinfo.central_directory()
+                buf += centdir
+                buf += filename
+                buf += extra_data
+                buf += zinfo.comment
+            else:
+                dt = zinfo.date_time
+                compress_type = zinfo.compress_type
+                if compress_type == ZIP_BZIP2:
+                    min_version = BZIP2_VERSION
+                elif compress_type == ZIP_LZMA:
+                    min_version = LZMA_VERSION
+                else:
+                    min_version = 0
+                filename, flag_bits = zinfo._encodeFilenameFlags()
+                crc = zinfo.CRC
+                extra_data = b''
+                if cls is AESZipInfo and zinfo.wz_aes_vendor_id is not None:
+                    extra_data, crc, compress_type = zinfo.encode_extra(
+                        crc, compress_type)
+                comment = zinfo.comment
+                buf += pack(
+                    stringCentralDir,
+                    max(min_version, zinfo.create_version),
+                    zinfo.create_system,
+                    max(min_version, zinfo.extract_version),
+                    zinfo.reserved,
+                    flag_bits,
+                    compress_type,
+                    dt[3] << 11 | dt[4] << 5 | (dt[5] // 2),
+                    (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2],
+                    crc,
+                    zinfo.compress_size,
+                    zinfo.file_size,
+                    len(filename),
+                    len(extra_data),
+                    len(comment),
+                    0,
+                    zinfo.internal_attr,
+                    zinfo.external_attr,
+                    zinfo.header_offset)
+                buf += filename
+                buf += extra_data
+                buf += comment
+            if len(buf) >= _CENTRAL_DIR_FLUSH_SIZE:
+                write(buf)
+                buf.clear()
+        write(buf)
+
     def _fpclose(self, fp):
         assert self._fileRefCnt > 0
         self._fileRefCnt -= 1
@@ -702,6 +1546,89 @@ class ZipFile:
             fp.close()
 
 
+# Leading bytes of formats that are compressed already.
+_COMPRESSED_MAGIC = (
+    b'PK\x03\x04',  # zip, jar, npz, docx, xlsx, whl
+    b'\x1f\x8b',  # gzip
+    b'BZh',  # bzip2
+    b'\xfd7zXZ\x00',  # xz
+    b'(\xb5/\xfd',  # zstd
+    b'\x04"M\x18',  # lz4
+    b"7z\xbc\xaf'\x1c",  # 7z
+    b'Rar!\x1a\x07',  # rar
+    b'\x89PNG\r\n\x1a\n',  # png
+    b'\xff\xd8\xff',  # jpeg
+    b'GIF8',  # gif
+    b'OggS',  # ogg
+    b'fLaC',  # flac
+    b'ID3',  # mp3
+    b'PAR1',  # parquet
+)
+
+_COMPRESSED_SUFFIXES = frozenset((
+    '.7z', '.avif', '.br', '.bz2', '.docx', '.flac', '.gif', '.gz', '.heic',
+    '.jar', '.jpeg', '.jpg', '.lz4', '.mkv', '.mov', '.mp3', '.mp4', '.npz',
+    '.ogg', '.parquet', '.png', '.pptx', '.rar', '.tgz', '.webm', '.webp',
+    '.whl', '.xlsx', '.xz', '.zip', '.zst',
+))
+
+
+def default_compression_policy(zinfo, sample):
+    """Choose the compression for a member from the start of its data.
+
+    Members that are compressed already, judging by their name, their magic
+    number or a fast trial deflate of the sample, are stored.  Members that
+    barely shrink are deflated at level 1.  Everything else keeps the
+    archive's setting.  Meant as compression_policy for ZipFile.
+    """
+    if zinfo.compress_type == ZIP_STORED or len(sample) < 512:
+        return None
+    suffix = os.path.splitext(zinfo.filename)[1].lower()
+    if suffix in _COMPRESSED_SUFFIXES or \
+            sample.startswith(_COMPRESSED_MAGIC) or \
+            sample[4:8] == b'ftyp' or \
+            (sample[:4] == b'RIFF' and sample[8:12] == b'WEBP'):  # noqa: E129
+        return ZIP_STORED, None
+    ratio = len(zlib.compress(sample, 1)) / len(sample)
+    if ratio > 0.95:
+        return ZIP_STORED, None
+    if ratio > 0.8 and zinfo.compress_type == ZIP_DEFLATED:
+        return ZIP_DEFLATED, 1
+    return None
+
+
+def _walk_tree(path, arcname):
+    if arcname:
+        yield path, arcname
+    with os.scandir(path) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        name = arcname + '/' + entry.name if arcname else entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_tree(entry.path, name)
+        else:
+            yield entry.path, name
+
+
+class _OffsetBuffer(io.BytesIO):
+    # Stands in for the archive file at offset, to capture what is written.
+
+    def __init__(self, offset):
+        super().__init__()
+        self._offset = offset
+
+    def tell(self):
+        return self._offset + super().tell()
+
+
+class _RecordBuffer(io.BytesIO):
+    # Records read by ZipFile.read_many(), decoded with the archive's stats.
+
+    def __init__(self, data, stats):
+        super().__init__(data)
+        self.stats = stats
+
+
 class AESZipDecrypter(BaseZipDecrypter):
     hmac_size = 10
 
@@ -748,6 +1675,99 @@ class AESZipDecrypter(BaseZipDecrypter):
             raise BadZipFile("Bad HMAC check for file %r" % self.filename)
 
 
+class AESZipEncrypter(BaseZipEncrypter):
+    """WinZip AES encrypter for the write path.
+
+    Compressed data is encrypted with AES in CTR mode and authenticated with
+    HMAC-SHA1, as described by the WinZip AE-1/AE-2 specification.  The
+    cipher and the HMAC are set up once per member, and every call to
+    encrypt() writes its output into the same buffer, which only grows when
+    a larger block is passed in.
+
+    Usage:
+        ze = AESZipEncrypter(mypwd)
+        ze.update_zipinfo(zinfo)
+        header = ze.encryption_header()
+        cypher_bytes = ze.encrypt(plain_bytes)
+        trailer = ze.flush()
+    """
+    hmac_size = 10
+
+    def __init__(self, pinyin, nbits=256, force_wz_aes_version=None):
+        if not pinyin:
+            raise RuntimeError('AES encryption requires a password.')
+        strengths = {128: 1, 192: 2, 256: 3}
+        if nbits not in strengths:
+            raise RuntimeError(
+                "`nbits` must be one of 128, 192, 256. Got '%s'" % nbits)
+
+        self.force_wz_aes_version = force_wz_aes_version
+        self.aes_strength = strengths[nbits]
+        key_length = WZ_KEY_LENGTHS[self.aes_strength]
+        salt_length = WZ_SALT_LENGTHS[self.aes_strength]
+
+        self.salt = Random.new().read(salt_length)
+        pwd_verify_length = 2
+        dkLen = 2 * key_length + pwd_verify_length
+        keymaterial = PBKDF2(pinyin, self.salt, count=1000, dkLen=dkLen)
+
+        self.encpwdverify = keymaterial[2 * key_length:]
+
+        enckey = keymaterial[:key_length]
+        self.encrypter = AES.new(
+            enckey,
+            AES.MODE_CTR,
+            counter=Counter.new(nbits=128, little_endian=True)
+        )
+        encmac_key = keymaterial[key_length:2 * key_length]
+        # hashlib's SHA-1 is considerably faster than Cryptodome's on large
+        # blocks, and the MAC covers every byte written.
+        self.hmac = hmac.new(encmac_key, digestmod=hashlib.sha1)
+        self._buffer = bytearray()
+
+    def update_zipinfo(self, zipinfo):
+        zipinfo.wz_aes_vendor_id = WZ_AES_VENDOR_ID
+        zipinfo.wz_aes_strength = self.aes_strength
+        # The version is chosen once, before the local header is written,
+        # so that it agrees with the central directory even when the local
+        # header cannot be rewritten with the final sizes.
+        if self.force_wz_aes_version is not None:
+            zipinfo.wz_aes_version = self.force_wz_aes_version
+        elif zipinfo.file_size < 20 or zipinfo.compress_type == ZIP_BZIP2:
+            # The only difference between version 1 and 2 is the handling of
+            # the CRC values. For version 2 the CRC value is not used and
+            # must be set to 0.
+            # For small files, the CRC files can leak the contents of the
+            # encrypted data.  Members written through open() have no size
+            # yet and get version 2 as well.
+            # For bzip2, the compression already has integrity checks so CRC
+            # is not required.
+            zipinfo.wz_aes_version = WZ_AES_V2
+        else:
+            zipinfo.wz_aes_version = WZ_AES_V1
+
+    def encryption_header(self):
+        return self.salt + self.encpwdverify
+
+    def encrypt(self, data):
+        """Encrypt data and return a view of the result.
+
+        The view is only valid until the next call.
+        """
+        size = len(data)
+        if not size:
+            return b''
+        if len(self._buffer) < size:
+            self._buffer = bytearray(size)
+        out = memoryview(self._buffer)[:size]
+        self.encrypter.encrypt(data, output=out)
+        self.hmac.update(out)
+        return out
+
+    def flush(self):
+        return self.hmac.digest()[:self.hmac_size]
+
+
 class AESZipInfo(ZipInfo):
     """Class with attributes describing each file in the ZIP archive."""
 
@@ -796,25 +1816,12 @@ class AESZipInfo(ZipInfo):
         wz_aes_extra = b''
         if self.wz_aes_vendor_id is not None:
             compress_type = WZ_AES_COMPRESS_TYPE
+            # Set by AESZipEncrypter.update_zipinfo for new members.
             aes_version = self.wz_aes_version
-            if aes_version is None:
-                if self.file_size < 20 | self.compress_type == ZIP_BZIP2:
-                    # The only difference between version 1 and 2 is the
-                    # handling of the CRC values. For version 2 the CRC value
-                    # is not used and must be set to 0.
-                    # For small files, the CRC files can leak the contents of
-                    # the encrypted data.
-                    # For bzip2, the compression already has integrity checks
-                    # so CRC is not required.
-                    aes_version = WZ_AES_V2
-                else:
-                    aes_version = WZ_AES_V1
-
             if aes_version == WZ_AES_V2:
                 crc = 0
 
-            wz_aes_extra = struct.pack(
-                "<3H2sBH",
+            wz_aes_extra = _WZ_AES_EXTRA_STRUCT.pack(
                 EXTRA_WZ_AES,
                 7,  # extra block body length: H2sBH
                 aes_version,
@@ -845,6 +1852,63 @@ class AESZipInfo(ZipInfo):
             **kwargs)
 
 
+def raw_zipinfo_(zinfo):
+    """Return a copy of zinfo for writing its record verbatim elsewhere.
+
+    The extra field is decoded again, so the WinZip AES parameters are kept
+    in the rewritten central directory even when zinfo was read by a plain
+    ZipFile.
+    """
+    new = AESZipInfo.__new__(AESZipInfo)
+    new.wz_aes_version = new.wz_aes_vendor_id = new.wz_aes_strength = None
+    for slot in ZipInfo.__slots__ + AESZipInfo.__slots__:
+        if hasattr(zinfo, slot):
+            setattr(new, slot, getattr(zinfo, slot))
+    if not isinstance(zinfo, AESZipInfo):
+        new._decodeExtra()
+    return new
+
+
+def copy_member(src_zip, name, dst_zip):
+    """Copy the member name of the ZipFile src_zip into the ZipFile dst_zip
+    as it is stored.
+
+    The local header, encryption header, compressed data, authentication
+    code and data descriptor are copied byte for byte and only the offset in
+    the central directory is rewritten, so nothing is decompressed and no
+    password is needed.  name may also be a ZipInfo.  Return the ZipInfo of
+    the copy.
+    """
+    zinfo = name if isinstance(name, ZipInfo) else src_zip.getinfo(name)
+    return dst_zip._copy_raw_member(src_zip, zinfo)
+
+
+def merge(dst_zip, *sources):
+    """Copy every member of the archives sources into the ZipFile dst_zip.
+
+    sources are ZipFile objects or paths.  Members are copied as by
+    copy_member(), in the order they are stored.  Of a name stored more
+    than once in a source, only the entry that source resolves it to is
+    copied.  A name that dst_zip already holds is skipped, so the first
+    archive to provide it wins.  Return the names copied.
+    """
+    copied = []
+    for source in sources:
+        if isinstance(source, ZipFile):
+            context = contextlib.nullcontext(source)
+        else:
+            context = ZipFile(source)
+        with context as src_zip:
+            infos = sorted(src_zip.NameToInfo.values(),
+                           key=lambda zinfo: zinfo.header_offset)
+            for zinfo in infos:
+                if zinfo.filename in dst_zip.NameToInfo:
+                    continue
+                copy_member(src_zip, zinfo, dst_zip)
+                copied.append(zinfo.filename)
+    return copied
+
+
 class AESZipExtFile(ZipExtFile):
 
     def setup_aeszipdecrypter(self):
@@ -876,7 +1940,7 @@ class AESZipExtFile(ZipExtFile):
             while self._compress_left > 0:
                 data = self._read2(self.MIN_READ_SIZE)
                 # but we don't want to find any more data here.
-                data = self._decompressor.decompress(data)
+                data = self._decompressor.decompress(data, 1)
                 if data:
                     raise BadZipFile(
                         "More data found than indicated by uncompressed size for "
@@ -884,7 +1948,19 @@ class AESZipExtFile(ZipExtFile):
                     )
 
         hmac_check = self._fileobj.read(self._decrypter.hmac_size)
-        self._decrypter.check_hmac(hmac_check)
+        try:
+            self._decrypter.check_hmac(hmac_check)
+        except BadZipFile:
+            if self._stats is not None:
+                self._stats.add('hmac_failures')
+            raise
+
+    def get_decrypter(self):
+        if self._stats is not None and \
+                self._decrypter_cls is AESZipDecrypter:
+            # Every AES decrypter derives its keys with PBKDF2.
+            self._stats.add('kdf_calls')
+        return super().get_decrypter()
 
     def check_integrity(self):
         if self._zinfo.wz_aes_version is not None:
@@ -1,4 +1,9 @@
 import bz2
+import collections
+import contextlib
+import functools
+import hashlib
+import hmac
 import importlib.util
 import io
 import lzma
@@ -89,6 +94,15 @@ structEndArchive = b"<4s4H2LH"
 stringEndArchive = b"PK\005\006"
 sizeEndCentDir = struct.calcsize(structEndArchive)
 
+ECD_SIGNATURE_ = 0
+_ECD_DISK_NUMBER = 1
+_ECD_DISK_START = 2
+_ECD_ENTRIES_THIS_DISK = 3
+_ECD_ENTRIES_TOTAL = 4
+ECD_SIZE_ = 5
+ECD_OFFSET_ = 6
+_ECD_COMMENT_SIZE = 7
+
 # The "Zip64 end of central directory locator" structure, magic number, and size
 structEndArchive64Locator = "<4sLQL"
 stringEndArchive64Locator = b"PK\x06\x07"
@@ -100,6 +114,13 @@ structEndArchive64 = "<4sQ2H2L4Q"
 stringEndArchive64 = b"PK\x06\x06"
 sizeEndCentDir64 = struct.calcsize(structEndArchive64)
 
+# The "central directory" structure, magic number, size, and indices
+# of entries in the structure (section V.F in the format document)
+structCentralDir = "<4s4B4HL2L5H2L"
+stringCentralDir = b"PK\001\002"
+sizeCentralDir = struct.calcsize(structCentralDir)
+_CENTRAL_DIR_STRUCT = struct.Struct(structCentralDir)
+
 # The "local file header" structure, magic number, size, and indices
 # (section V.A in the format document)
 structFileHeader = "<4s2B4HL2L2H"
@@ -139,6 +160,11 @@ _MASK_ENCRYPTED_CENTRAL_DIR = 1 << 13
 _MASK_RESERVED_BIT_14 = 1 << 14
 _MASK_RESERVED_BIT_15 = 1 << 15
 
+_DD_SIGNATURE = 0x08074b50
+stringDataDescriptor = b"PK\x07\x08"
+
+_EXTRA_FIELD_STRUCT = struct.Struct('<HH')
+
 
 def _strip_extra(extra, xids):
     # Remove Extra Fields with specified IDs.
@@ -579,8 +605,7 @@ class ZipInfo(object):
                                  internal_attr, external_attr, header_offset,
                                  extra_data, comment):
         try:
-            centdir = struct.pack(
-                structCentralDir,
+            centdir = _CENTRAL_DIR_STRUCT.pack(
                 stringCentralDir,
                 create_version,
                 create_system,
@@ -815,6 +840,30 @@ class BaseZipDecrypter:
         )
 
 
+class BaseZipEncrypter:
+    # Largest slice of compressed data handed to encrypt() at once.
+    block_size = 1 << 20
+
+    def update_zipinfo(self, zipinfo):
+        raise NotImplementedError(
+            'BaseZipEncrypter implementations must implement `update_zipinfo`.'
+        )
+
+    def encryption_header(self):
+        raise NotImplementedError(
+            'BaseZipEncrypter implementations must implement '
+            '`encryption_header`.'
+        )
+
+    def encrypt(self, data):
+        raise NotImplementedError(
+            'BaseZipEncrypter implementations must implement `encrypt`.'
+        )
+
+    def flush(self):
+        return b''
+
+
 class CRCZipDecrypter(BaseZipDecrypter):
     """PKWARE Encryption Decrypter
 
@@ -943,9 +992,11 @@ class LZMADecompressor:
         self._decomp = None
         self._unconsumed = b''
         self.eof = False
+        self.needs_input = True
 
-    def decompress(self, data):
+    def decompress(self, data, max_length=-1):
         if self._decomp is None:
+            # Only the header, at most 4 + 65535 bytes, is collected here.
             self._unconsumed += data
             if len(self._unconsumed) <= 4:
                 return b''
@@ -961,10 +1012,17 @@ class LZMADecompressor:
             data = self._unconsumed[4 + psize:]
             del self._unconsumed
 
-        result = self._decomp.decompress(data)
+        result = self._decomp.decompress(data, max_length)
         self.eof = self._decomp.eof
+        self.needs_input = self._decomp.needs_input
         return result
 
+    @property
+    def unused_data(self):
+        if self._decomp is None:
+            return b''
+        return self._decomp.unused_data
+
 
 compressor_names = {
     0: 'store',
@@ -1006,7 +1064,211 @@ def check_compression_(compression):
         raise NotImplementedError("That compression method is not supported")
 
 
-def _get_compressor(compress_type, compresslevel=None):
+def _multmodp(a, b):
+    # Multiply a and b modulo the CRC-32 polynomial, in reflected bit order.
+    m = 1 << 31
+    p = 0
+    while True:
+        if a & m:
+            p ^= b
+            if a & (m - 1) == 0:
+                break
+        m >>= 1
+        b = (b >> 1) ^ 0xEDB88320 if b & 1 else b >> 1
+    return p
+
+
+_x2n_table = [1 << 30]  # x^1
+for _ in range(31):
+    _x2n_table.append(_multmodp(_x2n_table[-1], _x2n_table[-1]))
+
+
+@functools.lru_cache(maxsize=64)
+def _x8nmodp(n):
+    # x^(8 * n) modulo the CRC-32 polynomial.  Blocks mostly share a length,
+    # so this is cached.
+    p = 1 << 31  # x^0
+    k = 3
+    while n:
+        if n & 1:
+            p = _multmodp(_x2n_table[k & 31], p)
+        n >>= 1
+        k += 1
+    return p
+
+
+def crc32_combine_(crc1, crc2, len2):
+    """Return the CRC-32 of A + B given crc32(A), crc32(B) and len(B)."""
+    return _multmodp(_x8nmodp(len2), crc1) ^ crc2
+
+
+class ParallelCompressor_:
+    """Compress a member in independent blocks on a thread pool.
+
+    Input is cut into blocks of block_size bytes that are compressed
+    concurrently, with at most two blocks per worker in flight.  Output is
+    returned in input order and forms a single stream that any decoder
+    reads.  The CRC-32 of the input is computed per block and combined, and
+    is available as crc once flush() has returned.
+    """
+
+    tracks_crc = True
+
+    def __init__(self, workers, block_size):
+        self._workers = workers
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._previous = b''
+        self._pending = collections.deque()
+        self._pool = None
+        self.crc = 0
+
+    def compress(self, data):
+        self._buffer += data
+        out = []
+        # Keep the last block back, flush() has to mark it as the final one.
+        while len(self._buffer) > self._block_size:
+            block = bytes(self._buffer[:self._block_size])
+            del self._buffer[:self._block_size]
+            self._submit(block, False)
+            while self._pending and (self._pending[0].done() or
+                                     len(self._pending) > 2 * self._workers):
+                out.append(self._collect())
+        return b''.join(out)
+
+    def flush(self):
+        block = bytes(self._buffer)
+        self._buffer = bytearray()
+        if self._pool is None:
+            # Fits in one block, no need for threads.
+            out = [self._finish(self._compress_block(block, b'', True))]
+        else:
+            self._submit(block, True)
+            out = [self._collect() for _ in range(len(self._pending))]
+            self._pool.shutdown()
+            self._pool = None
+        out.append(self._end())
+        return b''.join(out)
+
+    def _submit(self, block, last):
+        if self._pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(self._workers)
+        self._pending.append(self._pool.submit(
+            self._compress_block, block, self._previous, last))
+        self._previous = block
+
+    def _collect(self):
+        return self._finish(self._pending.popleft().result())
+
+    def _finish(self, result):
+        data, crc, size = result
+        self.crc = crc32_combine_(self.crc, crc, size)
+        return self._emit(data, size)
+
+    def _compress_block(self, block, previous, last):
+        raise NotImplementedError
+
+    def _emit(self, data, size):
+        return data
+
+    def _end(self):
+        return b''
+
+
+class ParallelDeflater_(ParallelCompressor_):
+    """Raw deflate, in the manner of pigz.
+
+    Each block is primed with the last 32 KiB of the block before it, so the
+    ratio stays close to that of a single compressor, and ends with a sync
+    flush so the blocks can be concatenated byte-aligned.
+    """
+
+    block_size = 128 * 1024
+
+    def __init__(self, compresslevel, workers):
+        super().__init__(workers, self.block_size)
+        if compresslevel is None:
+            compresslevel = zlib.Z_DEFAULT_COMPRESSION
+        self._level = compresslevel
+
+    def _compress_block(self, block, previous, last):
+        if previous:
+            compressor = zlib.compressobj(self._level, zlib.DEFLATED, -15,
+                                          zdict=previous[-32768:])
+        else:
+            compressor = zlib.compressobj(self._level, zlib.DEFLATED, -15)
+        data = compressor.compress(block)
+        data += compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+        return data, crc32(block), len(block)
+
+
+_BZ2_BLOCK_MAGIC = 0x314159265359
+_BZ2_EOS_MAGIC = 0x177245385090
+
+
+class ParallelBZ2Compressor_(ParallelCompressor_):
+    """bzip2, with every block compressed on its own.
+
+    Blocks are sized so bzip2 fits each one in a single compressed block,
+    even after its initial run-length encoding, which grows input by at most
+    a quarter.  The compressed blocks are then spliced bit by bit into one
+    stream, under one header and one end-of-stream marker carrying the
+    combined stream CRC, as lbzip2 does.
+    """
+
+    def __init__(self, compresslevel, workers):
+        if compresslevel is None:
+            compresslevel = 9
+        super().__init__(workers, 80000 * compresslevel - 100)
+        self._level = compresslevel
+        self._stream_crc = 0
+        self._bits = int.from_bytes(b'BZh%d' % compresslevel, 'big')
+        self._nbits = 32
+
+    def _compress_block(self, block, previous, last):
+        return bz2.compress(block, self._level), crc32(block), len(block)
+
+    def _emit(self, data, size):
+        if not size:
+            return b''
+        value = int.from_bytes(data, 'big')
+        total = len(data) * 8
+        # Stream header (32 bits), then block magic (48) and block CRC (32).
+        block_crc = (value >> (total - 112)) & 0xffffffff
+        trailer = (_BZ2_EOS_MAGIC << 32) | block_crc
+        for pad in range(8):
+            if (value >> pad) & ((1 << 80) - 1) == trailer:
+                break
+        else:
+            raise RuntimeError('bzip2 produced more than one block')
+        nbits = total - pad - 80 - 32
+        self._stream_crc = (((self._stream_crc << 1) |
+                             (self._stream_crc >> 31)) & 0xffffffff) ^ block_crc
+        return self._push((value >> (pad + 80)) & ((1 << nbits) - 1), nbits)
+
+    def _push(self, bits, nbits):
+        self._bits = (self._bits << nbits) | bits
+        self._nbits += nbits
+        spare = self._nbits % 8
+        out = (self._bits >> spare).to_bytes(self._nbits // 8, 'big')
+        self._bits &= (1 << spare) - 1
+        self._nbits = spare
+        return out
+
+    def _end(self):
+        out = self._push((_BZ2_EOS_MAGIC << 32) | self._stream_crc, 80)
+        if self._nbits:
+            out += bytes([(self._bits << (8 - self._nbits)) & 0xff])
+        return out
+
+
+def _get_compressor(compress_type, compresslevel=None, workers=None):
+    if workers is not None and workers > 1:
+        if compress_type == ZIP_DEFLATED:
+            return ParallelDeflater_(compresslevel, workers)
+        elif compress_type == ZIP_BZIP2:
+            return ParallelBZ2Compressor_(compresslevel, workers)
     if compress_type == ZIP_DEFLATED:
         if compresslevel is not None:
             return zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
@@ -1022,8 +1284,188 @@ def _get_compressor(compress_type, compresslevel=None):
         return None
 
 
+def copy_range_(src, offset, length, dst):
+    """Copy length bytes from offset in the file object src to the current
+    position of the file object dst.
+
+    Between two real files, with dst seekable, the data is moved by the
+    kernel with os.copy_file_range or os.sendfile, where the platform has
+    them, and never enters this process; otherwise it is copied in 1 MiB
+    chunks.
+    """
+    try:
+        src_fd = src.fileno()
+        dst_fd = dst.fileno() if dst.seekable() else None
+    except (AttributeError, OSError, ValueError):
+        src_fd = dst_fd = None
+    if dst_fd is not None and _KERNEL_COPIES:
+        # The kernel sees only what has reached the files.
+        src.flush()
+        dst.flush()
+        pos = dst.tell()
+        done = 0
+        for kernel_copy in _KERNEL_COPIES:
+            try:
+                while done < length:
+                    n = kernel_copy(src_fd, dst_fd, offset + done, pos + done,
+                                    length - done)
+                    if not n:
+                        raise EOFError
+                    done += n
+            except OSError:
+                # Not supported between these files; try the next way, from
+                # where this one stopped.
+                continue
+            break
+        # Seeking to the end drops whatever dst has buffered, which may now
+        # be stale, before moving past the copied bytes.
+        dst.seek(0, 2)
+        dst.seek(pos + done)
+        offset += done
+        length -= done
+    src.seek(offset)
+    while length > 0:
+        data = src.read(min(length, 1 << 20))
+        if not data:
+            raise EOFError
+        dst.write(data)
+        length -= len(data)
+
+
+def _copy_file_range(src_fd, dst_fd, src_offset, dst_offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, src_offset, dst_offset)
+
+
+def _sendfile(src_fd, dst_fd, src_offset, dst_offset, count):
+    os.lseek(dst_fd, dst_offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, src_offset, count)
+
+
+# Both are missing on Windows, and os.copy_file_range on macOS.
+_KERNEL_COPIES = tuple(
+    kernel_copy for name, kernel_copy in (
+        ('copy_file_range', _copy_file_range),
+        ('sendfile', _sendfile),
+    ) if hasattr(os, name)
+)
+
+
+# Counters kept by ZipFile(collect_stats=True); see ZipFile.stats().
+ZIP_STATS = (
+    'bytes_read',
+    'bytes_decrypted',
+    'bytes_decompressed',
+    'members_opened',
+    'seeks',
+    'local_header_reads',
+    'kdf_calls',
+    'lock_wait_seconds',
+    'crc_failures',
+    'hmac_failures',
+)
+
+
+class Counters_:
+    """Named counters that can be updated from any thread.
+
+    callback, if given, is called as callback(name, increment) after every
+    update, on the thread that did the work, for pushing to a metrics
+    system.
+    """
+
+    def __init__(self, names, callback=None):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(names, 0)
+        self.callback = callback
+
+    def add(self, name, value=1):
+        with self._lock:
+            self._values[name] += value
+        if self.callback is not None:
+            self.callback(name, value)
+
+    def snapshot(self):
+        """Return a dict of the current values."""
+        with self._lock:
+            return dict(self._values)
+
+
+# Counters kept by ContentCache_.
+CACHE_STATS = (
+    'hits',
+    'misses',
+    'evictions',
+    'oversized',
+)
+
+
+class ContentCache_:
+    """LRU cache of member contents held within a byte budget.
+
+    Entries larger than max_entry_size, a quarter of the budget unless
+    given, are not kept, so one large read cannot push out every hot entry.
+    Contents are stored and handed out as bytes, which callers cannot
+    change.
+    """
+
+    def __init__(self, budget, max_entry_size=None):
+        self.budget = budget
+        if max_entry_size is None:
+            max_entry_size = budget // 4
+        self.max_entry_size = max_entry_size
+        self._lock = threading.Lock()
+        # key -> bytes, least recently used first
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._counters = Counters_(CACHE_STATS)
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        self._counters.add('misses' if data is None else 'hits')
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_entry_size:
+            self._counters.add('oversized')
+            return
+        evicted = 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.budget:
+                _, old = self._entries.popitem(last=False)
+                self._size -= len(old)
+                evicted += 1
+        if evicted:
+            self._counters.add('evictions', evicted)
+
+    def invalidate(self, match=None):
+        """Drop the entries whose key match(key) is true, or all of them."""
+        with self._lock:
+            if match is None:
+                self._entries.clear()
+                self._size = 0
+                return
+            for key in [key for key in self._entries if match(key)]:
+                self._size -= len(self._entries.pop(key))
+
+    def stats(self):
+        """Return a dict of the CACHE_STATS counters and current usage."""
+        stats = self._counters.snapshot()
+        with self._lock:
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._size
+        return stats
+
+
 class SharedFile_:
-    def __init__(self, file, pos, close, lock, writing):
+    def __init__(self, file, pos, close, lock, writing, stats=None):
         self._file = file
         self._pos = pos
         self._close = close
@@ -1031,27 +1473,61 @@ class SharedFile_:
         self._writing = writing
         self.seekable = file.seekable
         self.tell = file.tell
+        # Counters_ of the owning ZipFile, or None.
+        self.stats = stats
+
+    def _acquire(self):
+        # Return the seconds spent waiting, recorded by _account() once the
+        # lock is released, as the stats callback may be slow.
+        if self.stats is None:
+            self._lock.acquire()
+            return 0
+        start = time.perf_counter()
+        self._lock.acquire()
+        return time.perf_counter() - start
+
+    def _account(self, waited, sought, nbytes=None):
+        if self.stats is None:
+            return
+        self.stats.add('lock_wait_seconds', waited)
+        if sought:
+            self.stats.add('seeks')
+        if nbytes is not None:
+            self.stats.add('bytes_read', nbytes)
 
     def seek(self, offset, whence=0):
-        with self._lock:
+        waited = self._acquire()
+        try:
             if self._writing():
                 raise ValueError("Can't reposition in the ZIP file while "
                                  "there is an open writing handle on it. "
                                  "Close the writing handle before trying to read.")
             self._file.seek(offset, whence)
             self._pos = self._file.tell()
-            return self._pos
+            pos = self._pos
+        finally:
+            self._lock.release()
+        self._account(waited, True)
+        return pos
 
     def read(self, n=-1):
-        with self._lock:
+        waited = self._acquire()
+        try:
             if self._writing():
                 raise ValueError("Can't read from the ZIP file while there "
                                  "is an open writing handle on it. "
                                  "Close the writing handle before trying to read.")
-            self._file.seek(self._pos)
+            # Only a handle that finds the file moved by another has to
+            # seek; a lone reader carries on where it stopped.
+            sought = self._file.tell() != self._pos
+            if sought:
+                self._file.seek(self._pos)
             data = self._file.read(n)
             self._pos = self._file.tell()
-            return data
+        finally:
+            self._lock.release()
+        self._account(waited, sought, len(data))
+        return data
 
     def close(self):
         if self._file is not None:
@@ -1061,7 +1537,7 @@ class SharedFile_:
 
 
 # Provide the tell method for unseekable stream
-class _Tellable:
+class Tellable_:
     def __init__(self, fp):
         self.fp = fp
         self.offset = 0
@@ -1106,14 +1582,21 @@ class ZipExtFile(io.BufferedIOBase):
     # Chunk size to read during seek
     MAX_SEEK_READ = 1 << 24
 
+    # Most compressed bytes read, and uncompressed bytes produced, in one
+    # step, so the memory held by a stream does not grow with the member.
+    MAX_BLOCK_SIZE = 1 << 22
+
     def __init__(self, fileobj, mode, zipinfo, close_fileobj=False, pinyin=None):
         self._fileobj = fileobj
         self._zinfo = zipinfo
         self._close_fileobj = close_fileobj
         self._pwd = pinyin
+        self._stats = getattr(fileobj, 'stats', None)
 
         self.process_local_header()
         self.raise_for_unsupported_flags()
+        if self._stats is not None:
+            self._stats.add('members_opened')
 
         self._compress_type = zipinfo.compress_type
         self._orig_compress_left = zipinfo.compress_size
@@ -1177,6 +1660,8 @@ class ZipExtFile(io.BufferedIOBase):
         fheader = struct.unpack(structFileHeader, fheader)
         if fheader[_FH_SIGNATURE] != stringFileHeader:
             raise BadZipFile("Bad magic number for file header")
+        if self._stats is not None:
+            self._stats.add('local_header_reads')
 
         fname = self._fileobj.read(fheader[_FH_FILENAME_LENGTH])
         if fheader[_FH_EXTRA_FIELD_LENGTH]:
@@ -1304,13 +1789,15 @@ class ZipExtFile(io.BufferedIOBase):
         If the argument is omitted, None, or negative, data is read and
         returned until EOF is reached.
         """
+        # _read1() returns at most MAX_BLOCK_SIZE bytes a step; the steps
+        # are joined once, as adding each to the result would copy it again.
         if n is None or n < 0:
-            buf = self._readbuffer[self._offset:]
+            chunks = [self._readbuffer[self._offset:]]
             self._readbuffer = b''
             self._offset = 0
             while not self._eof:
-                buf += self._read1(self.MAX_N)
-            return buf
+                chunks.append(self._read1(self.MAX_N))
+            return b''.join(chunks)
 
         end = n + self._offset
         if end < len(self._readbuffer):
@@ -1319,7 +1806,7 @@ class ZipExtFile(io.BufferedIOBase):
             return buf
 
         n = end - len(self._readbuffer)
-        buf = self._readbuffer[self._offset:]
+        chunks = [self._readbuffer[self._offset:]]
         self._readbuffer = b''
         self._offset = 0
         while n > 0 and not self._eof:
@@ -1327,11 +1814,11 @@ class ZipExtFile(io.BufferedIOBase):
             if n < len(data):
                 self._readbuffer = data
                 self._offset = n
-                buf += data[:n]
+                chunks.append(data[:n])
                 break
-            buf += data
+            chunks.append(data)
             n -= len(data)
-        return buf
+        return b''.join(chunks)
 
     def _update_crc(self, newdata):
         # Update the CRC using the given data.
@@ -1346,6 +1833,8 @@ class ZipExtFile(io.BufferedIOBase):
             return
         # Check the CRC if we're at the end of the file
         if self._eof and self._running_crc != self._expected_crc:
+            if self._stats is not None:
+                self._stats.add('crc_failures')
             raise BadZipFile("Bad CRC-32 for file %r" % self.name)
 
     def check_integrity(self):
@@ -1393,6 +1882,7 @@ class ZipExtFile(io.BufferedIOBase):
         # decrypt and decompress them.
         if self._eof or n <= 0:
             return b''
+        n = min(n, self.MAX_BLOCK_SIZE)
 
         # Read from file.
         if self._compress_type == ZIP_DEFLATED:
@@ -1400,6 +1890,10 @@ class ZipExtFile(io.BufferedIOBase):
             data = self._decompressor.unconsumed_tail
             if n > len(data):
                 data += self._read2(n - len(data))
+        elif self._compress_type != ZIP_STORED and \
+                not self._decompressor.needs_input:
+            # Drain the output of the input already buffered first.
+            data = b''
         else:
             data = self._read2(n)
 
@@ -1414,10 +1908,15 @@ class ZipExtFile(io.BufferedIOBase):
             if self._eof:
                 data += self._decompressor.flush()
         else:
-            data = self._decompressor.decompress(data)
-            self._eof = self._decompressor.eof or self._compress_left <= 0
+            n = max(n, self.MIN_READ_SIZE)
+            data = self._decompressor.decompress(data, n)
+            self._eof = (self._decompressor.eof or
+                         self._compress_left <= 0 and
+                         self._decompressor.needs_input)
 
         data = data[:self._left]
+        if self._stats is not None and self._compress_type != ZIP_STORED:
+            self._stats.add('bytes_decompressed', len(data))
         self._left -= len(data)
         if self._left <= 0:
             self._eof = True
@@ -1440,6 +1939,8 @@ class ZipExtFile(io.BufferedIOBase):
 
         if self._decrypter is not None:
             data = self._decrypter.decrypt(data)
+            if self._stats is not None:
+                self._stats.add('bytes_decrypted', len(data))
         return data
 
     def close(self):
@@ -1509,11 +2010,15 @@ class ZipWriteFile_(io.BufferedIOBase):
         self._zip64 = zip64
         self._zipfile = zf
         self._compressor = _get_compressor(zinfo.compress_type,
-                                           zinfo._compresslevel)
+                                           zinfo._compresslevel,
+                                           zf.compress_workers)
         self._encrypter = encrypter
         self._file_size = 0
         self._compress_size = 0
         self._crc = 0
+        # Small writes are collected here and passed on in one go.
+        self._pending = bytearray()
+        self._buffer_size = zf.write_buffer_size
 
         self.write_local_header()
 
@@ -1543,29 +2048,106 @@ class ZipWriteFile_(io.BufferedIOBase):
     def write(self, data):
         if self.closed:
             raise ValueError('I/O operation on closed file.')
-        nbytes = len(data)
+        if isinstance(data, (bytes, bytearray)):
+            nbytes = len(data)
+        else:
+            data = memoryview(data).cast('B')
+            nbytes = len(data)
         self._file_size += nbytes
-        self._crc = crc32(data, self._crc)
+        if nbytes >= self._buffer_size:
+            self._flush_pending()
+            self._write_block(data)
+        else:
+            self._pending += data
+            if len(self._pending) >= self._buffer_size:
+                self._flush_pending()
+        return nbytes
+
+    def writelines(self, lines):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        pending = self._pending
+        limit = self._buffer_size
+        for line in lines:
+            if isinstance(line, (bytes, bytearray)):
+                nbytes = len(line)
+            else:
+                line = memoryview(line).cast('B')
+                nbytes = len(line)
+            if nbytes >= limit:
+                self.write(line)
+                continue
+            self._file_size += nbytes
+            pending += line
+            if len(pending) >= limit:
+                self._flush_pending()
+
+    def _flush_pending(self):
+        if self._pending:
+            self._write_block(self._pending)
+            # Cleared in place, writelines() holds on to it.
+            self._pending.clear()
+
+    def _write_block(self, data):
+        if not getattr(self._compressor, 'tracks_crc', False):
+            self._crc = crc32(data, self._crc)
         if self._compressor:
             data = self._compressor.compress(data)
         if self._encrypter:
-            data = self._encrypter.encrypt(data)
-        self._compress_size += len(data)
-        self._fileobj.write(data)
-        return nbytes
+            self._write_encrypted(data)
+        else:
+            self._compress_size += len(data)
+            self._fileobj.write(data)
+
+    def _write_encrypted(self, data):
+        # The encrypter returns a buffer that is reused by its next call, so
+        # every block is written out before the next one is encrypted.
+        view = memoryview(data)
+        block_size = self._encrypter.block_size
+        for start in range(0, len(view), block_size):
+            buf = self._encrypter.encrypt(view[start:start + block_size])
+            self._compress_size += len(buf)
+            self._fileobj.write(buf)
 
     def close(self):
         if self.closed:
             return
         super().close()
+        self._finish_data()
+
+        # Write updated header info
+        if self._zinfo.use_datadescripter:
+            # Write CRC and file sizes after the file data
+            self._fileobj.write(self._zinfo.datadescripter(self._zip64))
+            self._zipfile.start_dir = self._fileobj.tell()
+        else:
+            # Seek backwards and write file header (which will now include
+            # correct CRC and file sizes)
+
+            # Preserve current position in file
+            self._zipfile.start_dir = self._fileobj.tell()
+            self._fileobj.seek(self._zinfo.header_offset)
+            self._fileobj.write(self._zinfo.FileHeader(self._zip64))
+            self._fileobj.seek(self._zipfile.start_dir)
+
+        self._zipfile._writing = False
+
+        # Successfully written: Add file to our caches
+        self._zipfile.filelist.append(self._zinfo)
+        self._zipfile.NameToInfo[self._zinfo.filename] = self._zinfo
+
+    def _finish_data(self):
+        self._flush_pending()
         # Flush any data from the compressor, and update header info
         if self._compressor:
             buf = self._compressor.flush()
+            if getattr(self._compressor, 'tracks_crc', False):
+                self._crc = self._compressor.crc
         else:
             buf = b''
         if self._encrypter:
-            buf = self._encrypter.encrypt(buf)
-            buf += self._encrypter.flush()
+            self._write_encrypted(buf)
+            buf = self._encrypter.flush()
         self._compress_size += len(buf)
         self._fileobj.write(buf)
         self._zinfo.compress_size = self._compress_size
@@ -1580,23 +2162,92 @@ class ZipWriteFile_(io.BufferedIOBase):
                 raise RuntimeError('Compressed size unexpectedly exceeded '
                                    'ZIP64 limit')
 
-        # Write updated header info
-        if self._zinfo.use_datadescripter:
-            # Write CRC and file sizes after the file data
-            self._fileobj.write(self._zinfo.datadescripter(self._zip64))
-            self._zipfile.start_dir = self._fileobj.tell()
-        else:
-            # Seek backwards and write file header (which will now include
-            # correct CRC and file sizes)
 
-            # Preserve current position in file
-            self._zipfile.start_dir = self._fileobj.tell()
-            self._fileobj.seek(self._zinfo.header_offset)
-            self._fileobj.write(self._zinfo.FileHeader(self._zip64))
-            self._fileobj.seek(self._zipfile.start_dir)
+class SpillWriteFile_(ZipWriteFile_):
+    """Write handle that compresses a member into a spool file.
 
-        self._zipfile._writing = False
+    Nothing reaches the archive until commit() is called, so several members
+    can be compressed and encrypted at once while the archive itself is
+    still written one member at a time.  Spools larger than spill_size are
+    moved to disk.
+    """
 
-        # Successfully written: Add file to our caches
-        self._zipfile.filelist.append(self._zinfo)
-        self._zipfile.NameToInfo[self._zinfo.filename] = self._zinfo
+    spill_size = 1 << 20
+
+    def __init__(self, zf, zinfo, zip64, encrypter=None, autocommit=False):
+        self._spool = tempfile.SpooledTemporaryFile(max_size=self.spill_size)
+        # Sizes are known before the local header is written, so no data
+        # descriptor is needed even for unseekable archives.
+        zinfo.flag_bits &= ~_MASK_USE_DATA_DESCRIPTOR
+        self._force_zip64 = zip64
+        self._autocommit = autocommit
+        super().__init__(zf, zinfo, zf._allowZip64, encrypter)
+        if autocommit:
+            with zf._lock:
+                zf._open_spills += 1
+
+    @property
+    def _fileobj(self):
+        return self._spool
+
+    def write_local_header(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
+        if type is not None and self._autocommit and not self.closed:
+            # Leave the archive untouched by a member that failed halfway.
+            io.BufferedIOBase.close(self)
+            self._release()
+            self.discard()
+            return
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        io.BufferedIOBase.close(self)
+        if not self._autocommit:
+            self._finish_data()
+            return
+        try:
+            self._finish_data()
+            self.commit()
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._zipfile._lock:
+            self._zipfile._open_spills -= 1
+
+    def commit(self):
+        """Append the finished member to the archive."""
+        if not self.closed:
+            raise ValueError('Cannot commit a member that is still open.')
+        zf = self._zipfile
+        zinfo = self._zinfo
+        zip64 = self._force_zip64 or \
+            zinfo.file_size > ZIP64_LIMIT or \
+            zinfo.compress_size > ZIP64_LIMIT  # noqa: E127
+        with zf._lock:
+            if not zf.fp:
+                raise ValueError(
+                    "Attempt to write to ZIP archive that was already closed")
+            if zf._writing:
+                raise ValueError("Can't write to the ZIP file while there is "
+                                 "another write handle open on it.")
+            if zf._seekable:
+                zf.fp.seek(zf.start_dir)
+            zinfo.header_offset = zf.fp.tell()
+            zf._writecheck(zinfo)
+            zf._didModify = True
+            zf.fp.write(zinfo.FileHeader(zip64))
+            self._spool.seek(0)
+            shutil.copyfileobj(self._spool, zf.fp, 1024 * 1024)
+            zf.start_dir = zf.fp.tell()
+            zf.filelist.append(zinfo)
+            zf.NameToInfo[zinfo.filename] = zinfo
+        self.discard()
+
+    def discard(self):
+        """Drop the spooled member without writing it."""
+        self._spool.close()
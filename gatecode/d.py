@@ -0,0 +1,967 @@
+from .b import *
+from .b import _FH_EXTRA_FIELD_LENGTH, _FH_FILENAME_LENGTH, _FH_SIGNATURE
+
+import atexit
+import contextlib
+import hashlib
+import hmac
+import json
+import marshal
+import uuid
+import weakref
+
+DEFAULT_CODE_CACHE_SIZE = 64 << 20
+
+_machine_id = None
+
+
+def machine_id_():
+    """Return a stable identifier for the running machine."""
+    global _machine_id
+    if _machine_id is None:
+        for path in ('/etc/machine-id', '/var/lib/dbus/machine-id'):
+            try:
+                with open(path, 'rb') as fp:
+                    data = fp.read().strip()
+            except OSError:
+                continue
+            if data:
+                _machine_id = data
+                break
+        else:
+            _machine_id = b'%012x' % uuid.getnode()
+    return _machine_id
+
+
+_identities = weakref.WeakKeyDictionary()
+
+
+def member_auth_code_(zip_file, zinfo):
+    """Return the authentication code stored with a WinZip AE-2 member.
+
+    AE-2 members store a CRC of 0, so the code, an HMAC of the encrypted
+    data and the last bytes of the record, stands in for it.  Return b''
+    for every other member.
+    """
+    if getattr(zinfo, 'wz_aes_version', None) != WZ_AES_V2:
+        return b''
+    size = AESZipDecrypter.hmac_size
+    with zip_file._lock:
+        fp = zip_file.fp
+        fp.seek(zinfo.header_offset)
+        fheader = fp.read(sizeFileHeader)
+        if len(fheader) != sizeFileHeader:
+            raise BadZipFile("Truncated file header")
+        fheader = struct.unpack(structFileHeader, fheader)
+        if fheader[_FH_SIGNATURE] != stringFileHeader:
+            raise BadZipFile("Bad magic number for file header")
+        fp.seek(zinfo.header_offset + sizeFileHeader +
+                fheader[_FH_FILENAME_LENGTH] +
+                fheader[_FH_EXTRA_FIELD_LENGTH] + zinfo.compress_size - size)
+        code = fp.read(size)
+    if len(code) != size:
+        raise BadZipFile("Truncated member record %r" % zinfo.filename)
+    return code
+
+
+def archive_identity_(zip_file):
+    """Return a digest identifying the contents of an opened archive.
+
+    The digest covers the name, CRC, sizes and offset of every member, and
+    the authentication code of WinZip AE-2 members, which have no CRC, so
+    it changes whenever the archive is rebuilt.  Only AE-2 members are read
+    for it; everything else comes from the central directory.
+    """
+    identity = _identities.get(zip_file)
+    if identity is None:
+        h = hashlib.sha256()
+        for zinfo in zip_file.filelist:
+            h.update(zinfo.filename.encode('utf-8'))
+            h.update(struct.pack('<LQQQ', zinfo.CRC, zinfo.compress_size,
+                                 zinfo.file_size, zinfo.header_offset))
+            h.update(member_auth_code_(zip_file, zinfo))
+        identity = _identities[zip_file] = h.digest()
+    return identity
+
+
+BUNDLE_NAME = '__bundle__.dpb'
+
+# Bundle layout: magic, entry count, then one fixed-size record plus the
+# UTF-8 name for every entry, followed by the concatenated payloads.
+# Offsets are relative to the start of the payload area.
+_BUNDLE_MAGIC = b'GCB1'
+_BUNDLE_HEADER = struct.Struct('<4sL')
+_BUNDLE_ENTRY = struct.Struct('<HQQL')
+
+_bundles = weakref.WeakKeyDictionary()
+_member_names = weakref.WeakKeyDictionary()
+
+
+def pack_bundle_(members):
+    """Pack a mapping of member names to payloads into a bundle blob."""
+    table = []
+    payloads = []
+    offset = 0
+    for name, data in members.items():
+        encoded = name.encode('utf-8')
+        table.append(_BUNDLE_ENTRY.pack(len(encoded), offset, len(data),
+                                        crc32(data)))
+        table.append(encoded)
+        payloads.append(data)
+        offset += len(data)
+    return b''.join([_BUNDLE_HEADER.pack(_BUNDLE_MAGIC, len(members))]
+                    + table + payloads)
+
+
+def unpack_bundle_(data):
+    """Return a dict mapping member names to (payload, CRC) from a bundle.
+
+    Every payload is checked against its CRC.
+    """
+    data = memoryview(data)
+    magic, count = _BUNDLE_HEADER.unpack_from(data)
+    if magic != _BUNDLE_MAGIC:
+        raise BadZipFile("Bad magic number for dp bundle")
+    pos = _BUNDLE_HEADER.size
+    entries = []
+    for _ in range(count):
+        name_len, offset, size, crc = _BUNDLE_ENTRY.unpack_from(data, pos)
+        pos += _BUNDLE_ENTRY.size
+        name = bytes(data[pos:pos + name_len]).decode('utf-8')
+        pos += name_len
+        entries.append((name, offset, size, crc))
+    members = {}
+    for name, offset, size, crc in entries:
+        payload = data[pos + offset:pos + offset + size]
+        if len(payload) != size:
+            raise BadZipFile("Truncated dp bundle member %r" % name)
+        if crc32(payload) != crc:
+            raise BadZipFile("Bad CRC-32 for dp bundle member %r" % name)
+        members[name] = (payload, crc)
+    return members
+
+
+def bundle_members_(zip_file):
+    """Return the bundle members of an archive, or None without a bundle.
+
+    The bundle is read and decrypted once per archive.
+    """
+    members = _bundles.get(zip_file, False)
+    if members is False:
+        if BUNDLE_NAME in zip_file.NameToInfo:
+            members = unpack_bundle_(zip_file.read(BUNDLE_NAME))
+        else:
+            members = None
+        _bundles[zip_file] = members
+    return members
+
+
+def member_names_(zip_file):
+    """Return the set of member names, including bundled members, of an
+    archive opened for reading."""
+    names = _member_names.get(zip_file)
+    if names is None:
+        names = set(zip_file.NameToInfo)
+        members = bundle_members_(zip_file)
+        if members:
+            names.update(members)
+        _member_names[zip_file] = names
+    return names
+
+
+def read_member_(zip_file, name):
+    """Return the bytes of member name, looking in the bundle first."""
+    members = bundle_members_(zip_file)
+    if members and name in members:
+        return bytes(members[name][0])
+    return zip_file.read(name)
+
+
+def member_crc_(zip_file, name):
+    """Return the CRC-32, size and authentication code of member name.
+
+    The code is that of a WinZip AE-2 member, which stores a CRC of 0, and
+    b'' for every other member and for bundled ones.
+    """
+    members = bundle_members_(zip_file)
+    if members and name in members:
+        payload, crc = members[name]
+        return crc, len(payload), b''
+    zinfo = zip_file.getinfo(name)
+    return zinfo.CRC, zinfo.file_size, member_auth_code_(zip_file, zinfo)
+
+
+def build_bundle(src, dst, pinyin=None, compresslevel=9):
+    """Rewrite the dp archive src as dst holding a single bundle member.
+
+    Every module payload and package source of src is packed into one
+    compressed member, encrypted with WinZip AES when pinyin is given, so
+    loading the package costs a single decrypt.  pinyin is also used to read
+    encrypted members of src.
+    """
+    from .a import AESZipFile
+    members = {}
+    with AESZipFile(src) as zf:
+        if pinyin:
+            zf.setpassword(pinyin)
+        for name in zf.namelist():
+            if name == BUNDLE_NAME or name.endswith('/'):
+                continue
+            members[name] = zf.read(name)
+    blob = pack_bundle_(members)
+    with AESZipFile(dst, 'w', compression=ZIP_DEFLATED,
+                    compresslevel=compresslevel,
+                    encryption=WZ_AES if pinyin else None) as zf:
+        if pinyin:
+            zf.setpassword(pinyin)
+        zf.writestr(BUNDLE_NAME, blob)
+    return sorted(members)
+
+
+class CodeCache:
+    """Persistent cache of code objects loaded from dp archives.
+
+    Entries are marshalled code objects encrypted with AES-GCM under a key
+    derived from the archive password, the archive identity and the machine,
+    so protected code never reaches the disk in plaintext.  An entry is
+    addressed by (archive identity, member CRC or AE-2 authentication code,
+    interpreter magic number).
+    When the cache grows beyond max_size the least recently used entries are
+    evicted.
+
+    The cache is best effort: unreadable, stale or tampered entries are
+    treated as misses and I/O errors are ignored.  Archives without a
+    password are not cached, since their key would be derived from public
+    data alone.
+    """
+
+    suffix = '.gcc'
+    nonce_size = 12
+    tag_size = 16
+
+    def __init__(self, path, max_size=DEFAULT_CODE_CACHE_SIZE):
+        self.path = os.fspath(path)
+        self.max_size = max_size
+        self._keys = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _archive_key(self, zip_file, bind_archive):
+        if not zip_file.pinyin:
+            return None
+        keys = self._keys.get(zip_file)
+        if keys is None:
+            keys = self._keys[zip_file] = {}
+        key = keys.get(bind_archive)
+        if key is None:
+            msg = machine_id_() + importlib.util.MAGIC_NUMBER
+            if bind_archive:
+                msg += archive_identity_(zip_file)
+            key = keys[bind_archive] = hmac.new(
+                zip_file.pinyin, msg, hashlib.sha256).digest()
+        return key
+
+    def _entry(self, zip_file, name, bind_archive):
+        # Return the path and key of the entry for member name, or
+        # (None, None) when the archive cannot be cached.
+        key = self._archive_key(zip_file, bind_archive)
+        if key is None:
+            return None, None
+        crc, size, auth_code = member_crc_(zip_file, name)
+        msg = b'%s\0%08x\0%d' % (name.encode('utf-8'), crc, size)
+        if auth_code:
+            msg += b'\0' + auth_code
+        tag = hmac.new(key, msg, hashlib.sha256).hexdigest()
+        return os.path.join(self.path, tag + self.suffix), key
+
+    def load(self, zip_file, name, bind_archive=True):
+        """Return the cached code object for member name, or None."""
+        path, key = self._entry(zip_file, name, bind_archive)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as fp:
+                data = fp.read()
+        except OSError:
+            return None
+        nonce = data[:self.nonce_size]
+        tag = data[self.nonce_size:self.nonce_size + self.tag_size]
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(os.path.basename(path).encode('ascii'))
+        try:
+            code = marshal.loads(cipher.decrypt_and_verify(
+                data[self.nonce_size + self.tag_size:], tag))
+        except (ValueError, EOFError, TypeError):
+            self._discard(path)
+            return None
+        try:
+            # Mark the entry as recently used.
+            os.utime(path)
+        except OSError:
+            pass
+        return code
+
+    def store(self, zip_file, name, code, bind_archive=True):
+        """Encrypt and store the code object loaded from member name."""
+        path, key = self._entry(zip_file, name, bind_archive)
+        if path is None:
+            return
+        nonce = Random.new().read(self.nonce_size)
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(os.path.basename(path).encode('ascii'))
+        data, tag = cipher.encrypt_and_digest(marshal.dumps(code))
+        data = nonce + tag + data
+        try:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    fp.write(data)
+                try:
+                    # A rewritten entry replaces the old one's bytes.
+                    replaced = os.stat(path).st_size
+                except OSError:
+                    replaced = 0
+                os.replace(tmp, path)
+            except BaseException:
+                self._discard(tmp)
+                raise
+        except OSError:
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[0]
+            else:
+                self._size += len(data) - replaced
+            if self._size > self.max_size:
+                self._evict()
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            for size, path in self._scan()[1]:
+                self._discard(path)
+            self._size = 0
+
+    def _scan(self):
+        # Return the total size and the entries, least recently used first.
+        entries = []
+        try:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.suffix):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            pass
+        entries.sort()
+        return (sum(e[1] for e in entries),
+                [(size, path) for _, size, path in entries])
+
+    def _evict(self):
+        total, entries = self._scan()
+        for size, path in entries:
+            if total <= self.max_size:
+                break
+            self._discard(path)
+            total -= size
+        self._size = total
+
+    @staticmethod
+    def _discard(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+PYC_SUFFIX = 'c'
+_PYC_CHECKED_HASH = 0b11
+
+
+def code_to_pyc_(code, source):
+    """Return a checked hash-based pyc image for code compiled from source."""
+    return (importlib.util.MAGIC_NUMBER
+            + struct.pack('<L', _PYC_CHECKED_HASH)
+            + importlib.util.source_hash(source)
+            + marshal.dumps(code))
+
+
+def pyc_to_code_(data, source):
+    """Return the code object in a pyc image, or None if it is unusable.
+
+    The image must come from the running interpreter and be a hash-based pyc
+    whose hash matches source.
+    """
+    if (len(data) < 16 or data[:4] != importlib.util.MAGIC_NUMBER
+            or struct.unpack('<L', data[4:8])[0] & 0b1 == 0
+            or data[8:16] != importlib.util.source_hash(source)):
+        return None
+    try:
+        return marshal.loads(memoryview(data)[16:])
+    except (ValueError, EOFError, TypeError):
+        return None
+
+
+def load_source_member_(zip_file, name, code_cache=None):
+    """Return the code object for the plain source member name.
+
+    A precompiled ``<name>c`` member is used when it matches the source and
+    the interpreter; otherwise the source is compiled once and kept in
+    code_cache, keyed on the member CRC.
+    """
+    source = read_member_(zip_file, name)
+    pyc_name = name + PYC_SUFFIX
+    if pyc_name in member_names_(zip_file):
+        code = pyc_to_code_(read_member_(zip_file, pyc_name), source)
+        if code is not None:
+            return code
+    if code_cache is not None:
+        code = code_cache.load(zip_file, name, bind_archive=False)
+        if code is not None:
+            return code
+    code = compile(source.decode('utf-8'), name, 'exec')
+    if code_cache is not None:
+        code_cache.store(zip_file, name, code, bind_archive=False)
+    return code
+
+
+def compile_init_members(path):
+    """Add precompiled bytecode for the plain __init__.py members of a dp
+    archive.
+
+    Meant to run once per release with the interpreter used in production.
+    Members whose bytecode is already current are left alone.  Return the
+    names of the members written.
+    """
+    from .a import AESZipFile
+
+    # Rewriting the central directory through a plain ZipFile would drop the
+    # WinZip AES records of the encrypted members.
+    written = []
+    with AESZipFile(path, 'a', compression=ZIP_DEFLATED) as zf:
+        for name in zf.namelist():
+            if not (name == '__init__.py' or name.endswith('/__init__.py')):
+                continue
+            source = zf.read(name)
+            pyc_name = name + PYC_SUFFIX
+            if (pyc_name in zf.NameToInfo and
+                    pyc_to_code_(zf.read(pyc_name), source) is not None):
+                continue
+            code = compile(source.decode('utf-8'), name, 'exec')
+            zf.writestr(pyc_name, code_to_pyc_(code, source))
+            written.append(pyc_name)
+    return written
+
+
+class ImportTrace:
+    """Sequence of archive members read by DPLoader.
+
+    Record one with trace_imports().
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def record(self, archive, name):
+        with self._lock:
+            self.events.append((os.path.abspath(archive), name))
+
+    def members(self, archive=None):
+        """Return the member names read from archive, first read first.
+
+        Without archive, names read from every archive are returned.
+        """
+        if archive is not None:
+            archive = os.path.abspath(archive)
+        seen = set()
+        names = []
+        with self._lock:
+            for path, name in self.events:
+                if archive is not None and path != archive:
+                    continue
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        return names
+
+
+_import_traces = []
+
+
+def record_member_(archive, name):
+    """Report that DPLoader read member name of archive."""
+    for trace in _import_traces:
+        trace.record(archive, name)
+
+
+@contextlib.contextmanager
+def trace_imports():
+    """Record the members DPLoader reads inside the with block.
+
+        with trace_imports() as trace:
+            import my_app
+        rewrite_layout(archive, new_archive, trace.members(archive))
+    """
+    trace = ImportTrace()
+    _import_traces.append(trace)
+    try:
+        yield trace
+    finally:
+        _import_traces.remove(trace)
+
+
+# Counters kept by the dp importer when dp_import() is given collect_stats.
+IMPORT_STATS = ('find_spec_calls', 'find_spec_hits', 'find_spec_misses')
+
+
+def dp_stats():
+    """Return the counters of every dp archive imported from, by path.
+
+    Each dict holds the importer counters named in IMPORT_STATS and the
+    archive counters of ZipFile.stats(); it is empty for archives imported
+    without collect_stats.
+    """
+    stats = {}
+    for path, finder in list(sys.path_importer_cache.items()):
+        if isinstance(getattr(finder, 'zip_file', None), ZipFile) and \
+                callable(getattr(finder, 'stats', None)):
+            stats[path] = finder.stats()
+    return stats
+
+
+def rewrite_layout(src, dst, order):
+    """Copy the archive src to dst with the members in order stored first.
+
+    The members named in order are laid out contiguously in that order,
+    each followed by its precompiled bytecode member if there is one; the
+    remaining members keep their relative order after them.  Member records
+    are copied byte for byte, so nothing is decrypted or re-encrypted.
+    """
+    with ZipFile(src) as zin, ZipFile(dst, 'w') as zout:
+        infos = sorted(zin.infolist(), key=lambda zinfo: zinfo.header_offset)
+        rank = {}
+        for name in order:
+            for member in (name, name + PYC_SUFFIX):
+                if member in zin.NameToInfo and member not in rank:
+                    rank[member] = len(rank)
+        infos.sort(key=lambda zinfo: rank.get(zinfo.filename, len(rank)))
+        for zinfo in infos:
+            zout._copy_raw_member(zin, zinfo)
+        zout.comment = zin.comment
+    return [zinfo.filename for zinfo in infos]
+
+
+TRACE_SUFFIX = '.trace'
+
+
+class MemberPrefetcher:
+    """Records the members loaded from an archive and prefetches them on
+    later starts.
+
+    On the first start the names passed to get() are recorded and written to
+    trace_path at exit, together with the archive identity.  When a trace
+    for the same archive exists, start() replays it in a background thread,
+    calling load(name) for every member ahead of the importing code; get()
+    then returns the prefetched result.  A trace recorded for a different
+    build of the archive is ignored and recorded again.
+    """
+
+    _CLAIMED = object()
+
+    def __init__(self, zip_file, trace_path, load):
+        self.zip_file = zip_file
+        self.trace_path = trace_path
+        self._load = load
+        self._identity = archive_identity_(zip_file).hex()
+        self._lock = threading.Lock()
+        self._state = {}
+        self._recorded = []
+        self._thread = None
+        self.trace = self._read_trace()
+        if self.trace is None:
+            atexit.register(self.save)
+
+    def _read_trace(self):
+        try:
+            with open(self.trace_path, 'r', encoding='utf-8') as fp:
+                trace = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(trace, dict) or trace.get('identity') != self._identity:
+            return None
+        names = member_names_(self.zip_file)
+        return [name for name in trace.get('members', ()) if name in names]
+
+    def start(self):
+        """Start prefetching the traced members in a background thread."""
+        if self.trace and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='gatecode-prefetch', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for name in self.trace:
+            with self._lock:
+                if name in self._state:
+                    continue
+                event = self._state[name] = threading.Event()
+            try:
+                result = (self._load(name),)
+            except Exception:
+                # Let the importing code load it again and see the error.
+                result = None
+            with self._lock:
+                self._state[name] = result
+            event.set()
+
+    def get(self, name):
+        """Return the prefetched result for member name, or None.
+
+        With None the caller loads the member itself.
+        """
+        with self._lock:
+            if self.trace is None:
+                self._recorded.append(name)
+            state = self._state.get(name)
+            if state is None:
+                self._state[name] = self._CLAIMED
+                return None
+        if isinstance(state, threading.Event):
+            state.wait()
+            with self._lock:
+                state = self._state.get(name)
+        if isinstance(state, tuple):
+            with self._lock:
+                self._state[name] = self._CLAIMED
+            return state[0]
+        return None
+
+    def save(self):
+        """Write the recorded trace next to the archive."""
+        with self._lock:
+            members = list(self._recorded)
+        if not members:
+            return
+        data = json.dumps({'identity': self._identity, 'members': members})
+        try:
+            directory = os.path.dirname(os.path.abspath(self.trace_path))
+            fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+                    fp.write(data)
+                os.replace(tmp, self.trace_path)
+            except BaseException:
+                CodeCache._discard(tmp)
+                raise
+        except OSError:
+            pass
+
+
+DELTA_MANIFEST = '__delta__.json'
+_DELTA_FORMAT = 1
+
+
+class _HashSink:
+    """Write-only file that keeps the SHA-256 of what is written to it."""
+
+    def __init__(self):
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def _record_digest(zip_file, zinfo):
+    start, end = zip_file._member_span(zinfo)
+    h = hashlib.sha256()
+    zip_file.fp.seek(start)
+    remaining = end - start
+    while remaining:
+        data = zip_file.fp.read(min(remaining, 1 << 20))
+        if not data:
+            raise BadZipFile("Truncated member record %r" % zinfo.filename)
+        h.update(data)
+        remaining -= len(data)
+    return h.digest()
+
+
+def _same_member(old_zip, old, new_zip, new, pinyin):
+    if (old.CRC, old.file_size, old.compress_size, old.compress_type) != \
+            (new.CRC, new.file_size, new.compress_size, new.compress_type):
+        return False
+    if getattr(new, 'wz_aes_version', None) != WZ_AES_V2:
+        return True
+    # WinZip AE-2 members carry no CRC, so compare the contents instead.
+    if pinyin:
+        return old_zip.read(old, pinyin) == new_zip.read(new, pinyin)
+    return _record_digest(old_zip, old) == _record_digest(new_zip, new)
+
+
+def make_delta(old, new, delta, pinyin=None):
+    """Write to delta the update that turns the dp archive old into new.
+
+    Members of new are matched with those of old by name, CRC and sizes;
+    only the records of the members that differ are stored in delta, byte
+    for byte, next to a manifest describing the layout of the new archive.
+    pinyin is only needed to compare WinZip AE-2 members, which store no
+    CRC, by their contents rather than their encrypted records.
+
+    The archive apply_delta() rebuilds holds the same members as new, in
+    the same order, but takes unchanged records from old, so it need not
+    be identical to new.  Return the names of the members stored in delta.
+    """
+    from .a import AESZipFile
+
+    members = []
+    changed = []
+    sink = _HashSink()
+    with AESZipFile(old) as zold, AESZipFile(new) as znew, \
+            ZipFile(delta, 'w') as zdelta:
+        # Build the archive the consumer will, to learn its digest.
+        with ZipFile(sink, 'w') as zcheck:
+            for zinfo in sorted(znew.infolist(),
+                                key=lambda zinfo: zinfo.header_offset):
+                prev = zold.NameToInfo.get(zinfo.filename)
+                if prev is not None and _same_member(zold, prev, znew, zinfo,
+                                                     pinyin):
+                    copy_member(zold, prev, zcheck)
+                    members.append([zinfo.filename, 'old'])
+                else:
+                    copy_member(znew, zinfo, zcheck)
+                    copy_member(znew, zinfo, zdelta)
+                    members.append([zinfo.filename, 'delta'])
+                    changed.append(zinfo.filename)
+            zcheck.comment = znew.comment
+        manifest = {
+            'format': _DELTA_FORMAT,
+            'base': archive_identity_(zold).hex(),
+            'members': members,
+            'comment': znew.comment.hex(),
+            'size': sink.size,
+            'sha256': sink.hash.hexdigest(),
+        }
+        zdelta.writestr(DELTA_MANIFEST, json.dumps(manifest),
+                        compress_type=ZIP_DEFLATED)
+    return changed
+
+
+def _load_manifest(zdelta, zold, package):
+    manifest = json.loads(zdelta.read(DELTA_MANIFEST).decode('utf-8'))
+    if manifest.get('format') != _DELTA_FORMAT:
+        raise ValueError("Unsupported delta format %r"
+                         % manifest.get('format'))
+    if bool(manifest.get('package')) != package:
+        raise ValueError("Delta was made for a %s"
+                         % ('dp archive' if package else 'deployed package'))
+    if manifest['base'] != archive_identity_(zold).hex():
+        raise ValueError("Delta was made for a different base archive")
+    return manifest
+
+
+def _file_digest(fp):
+    fp.flush()
+    fp.seek(0)
+    h = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: fp.read(1 << 20), b''):
+        h.update(block)
+        size += len(block)
+    return size, h.hexdigest()
+
+
+def _build_verified(new, manifest, build):
+    """Write build(fp)'s archive next to new and check it against manifest.
+
+    Return the path of the temporary file, which the caller moves into
+    place once every archive it was built from is closed.
+    """
+    fd, tmp = tempfile.mkstemp(
+        suffix='.tmp', dir=os.path.dirname(os.path.abspath(new)))
+    try:
+        with os.fdopen(fd, 'w+b') as fp:
+            build(fp)
+            digest = _file_digest(fp)
+        if digest != (manifest['size'], manifest['sha256']):
+            raise BadZipFile("Rebuilt archive does not match the delta")
+    except BaseException:
+        CodeCache._discard(tmp)
+        raise
+    return tmp
+
+
+def _replace(tmp, new):
+    try:
+        os.replace(tmp, new)
+    except BaseException:
+        CodeCache._discard(tmp)
+        raise
+
+
+def apply_delta(old, delta, new):
+    """Rebuild the new dp archive from old and a delta made by make_delta().
+
+    Records are copied from old and delta as they are stored, so no
+    password is needed.  The result is written next to new and moved into
+    place only once its SHA-256 matches the manifest; new may be old
+    itself, but must not be open elsewhere (by a running dp_import(), say),
+    as Windows cannot replace a file that is open.  Raise ValueError if
+    delta was made for another base archive and BadZipFile if the result
+    does not verify.  Return the names of the members taken from delta.
+    """
+    from .a import AESZipFile
+
+    new = os.fspath(new)
+    changed = []
+    with AESZipFile(old) as zold, ZipFile(delta) as zdelta:
+        manifest = _load_manifest(zdelta, zold, False)
+
+        def build(fp):
+            with ZipFile(fp, 'w') as zout:
+                for name, source in manifest['members']:
+                    if source == 'old':
+                        copy_member(zold, name, zout)
+                    else:
+                        copy_member(zdelta, name, zout)
+                        changed.append(name)
+                zout.comment = bytes.fromhex(manifest['comment'])
+
+        tmp = _build_verified(new, manifest, build)
+    # Both archives are closed first: new may be old, and Windows cannot
+    # replace a file that is still open.
+    _replace(tmp, new)
+    return changed
+
+
+_PACKAGE_DP_SUFFIX = '.dp'
+_PACKAGE_DELTA_SUFFIX = '.delta'
+
+
+def _build_package(fp, manifest, zold, zrecords, rebuild):
+    """Write the deployed package described by manifest to fp.
+
+    Unchanged members are copied from zold and changed ones from zrecords;
+    rebuild(name) returns the path of the rebuilt dp archive name and the
+    names of its members that changed.  Dp archives are stored, with the
+    date and attributes of the new package, so that every build of the
+    same package is identical.
+    """
+    changed = []
+    with ZipFile(fp, 'w') as zout:
+        for entry in manifest['members']:
+            name, source = entry[:2]
+            if source == 'old':
+                copy_member(zold, name, zout)
+            elif source == 'delta':
+                copy_member(zrecords, name, zout)
+                changed.append(name)
+            else:
+                path, names = rebuild(name)
+                zinfo = ZipInfo(name, tuple(entry[2]))
+                zinfo.external_attr = entry[3]
+                zinfo.file_size = os.path.getsize(path)
+                with open(path, 'rb') as src, zout.open(zinfo, 'w') as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                changed.extend(name + '/' + member for member in names)
+        zout.comment = bytes.fromhex(manifest['comment'])
+    return changed
+
+
+def make_package_delta(old, new, delta, pinyin=None):
+    """Write to delta the update that turns the deployed package old into new.
+
+    A deployed package is the zip add_dp_package() loads: the dp archive
+    next to the dploader extension.  Dp archives found in both packages are
+    compared as by make_delta(), any other member that differs is stored in
+    delta whole.  apply_package_delta() stores the rebuilt dp archives
+    uncompressed, so its package need not be identical to new either.
+    Return the names of the members stored in delta, those of a dp
+    archive as '<dp archive>/<member>'.
+    """
+    members = []
+    changed = []
+    inner = {}
+    with ZipFile(old) as zold, ZipFile(new) as znew, \
+            tempfile.TemporaryDirectory() as tmpdir, \
+            ZipFile(delta, 'w') as zdelta:
+        for zinfo in sorted(znew.infolist(),
+                            key=lambda zinfo: zinfo.header_offset):
+            name = zinfo.filename
+            prev = zold.NameToInfo.get(name)
+            if prev is not None and name.endswith(_PACKAGE_DP_SUFFIX):
+                old_dp = zold.extract(prev, os.path.join(tmpdir, 'old'))
+                new_dp = znew.extract(zinfo, os.path.join(tmpdir, 'new'))
+                dp_delta = os.path.join(tmpdir, '%d.delta' % len(members))
+                make_delta(old_dp, new_dp, dp_delta, pinyin)
+                zdelta.write(dp_delta, name + _PACKAGE_DELTA_SUFFIX)
+                inner[name] = old_dp, dp_delta
+                members.append([name, 'dp', list(zinfo.date_time),
+                                zinfo.external_attr])
+            elif prev is not None and _same_member(zold, prev, znew, zinfo,
+                                                   None):
+                members.append([name, 'old'])
+            else:
+                copy_member(znew, zinfo, zdelta)
+                members.append([name, 'delta'])
+        manifest = {
+            'format': _DELTA_FORMAT,
+            'package': True,
+            'base': archive_identity_(zold).hex(),
+            'members': members,
+            'comment': znew.comment.hex(),
+        }
+
+        # Build the package the consumer will, to learn its digest.
+        def rebuild(name):
+            path = os.path.join(tmpdir, 'rebuilt.dp')
+            return path, apply_delta(*inner[name], path)
+
+        with open(os.path.join(tmpdir, 'check.zip'), 'w+b') as fp:
+            changed = _build_package(fp, manifest, zold, znew, rebuild)
+            manifest['size'], manifest['sha256'] = _file_digest(fp)
+        zdelta.writestr(DELTA_MANIFEST, json.dumps(manifest),
+                        compress_type=ZIP_DEFLATED)
+    return changed
+
+
+def apply_package_delta(old, delta, new):
+    """Rebuild the new deployed package from old and make_package_delta()'s
+    delta.
+
+    Like apply_delta(), the result is moved into place only once it
+    verifies, and new may be old but must not be open elsewhere.  Raise
+    ValueError if delta was made for another package and BadZipFile if
+    the result does not verify.  Return the names of the members taken
+    from delta, as make_package_delta() does.
+    """
+    new = os.fspath(new)
+    with ZipFile(old) as zold, ZipFile(delta) as zdelta, \
+            tempfile.TemporaryDirectory() as tmpdir:
+        manifest = _load_manifest(zdelta, zold, True)
+
+        def rebuild(name):
+            old_dp = zold.extract(name, os.path.join(tmpdir, 'old'))
+            dp_delta = zdelta.extract(name + _PACKAGE_DELTA_SUFFIX,
+                                      os.path.join(tmpdir, 'delta'))
+            path = os.path.join(tmpdir, 'rebuilt.dp')
+            return path, apply_delta(old_dp, dp_delta, path)
+
+        changed = []
+
+        def build(fp):
+            changed.extend(_build_package(fp, manifest, zold, zdelta, rebuild))
+
+        tmp = _build_verified(new, manifest, build)
+    _replace(tmp, new)
+    return changed
@@ -0,0 +1,269 @@
+import collections
+import io
+import os
+import threading
+import time
+
+
+class RangeReader:
+    """Source of byte ranges of one object, such as an archive kept on
+    object storage.
+
+    read_range() may be called from several threads at once, and must
+    return all length bytes unless the range runs to the end of the object;
+    RangeFile raises OSError when it does not.  Wrap a reader in a
+    RangeFile to open it with ZipFile.
+    """
+
+    def size(self):
+        raise NotImplementedError(
+            'RangeReader implementations must implement `size`.'
+        )
+
+    def read_range(self, offset, length):
+        raise NotImplementedError(
+            'RangeReader implementations must implement `read_range`.'
+        )
+
+    def close(self):
+        pass
+
+
+class LocalRangeReader(RangeReader):
+    """RangeReader over a local file that can pretend to be remote.
+
+    Every request sleeps for latency seconds first, and requests and
+    bytes_read count what was asked for, so the number of round trips a
+    remote store would see can be checked in tests and benchmarks.
+    """
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.requests = 0
+        self.bytes_read = 0
+        self._count_lock = threading.Lock()
+        self._seek_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+
+    def size(self):
+        return os.fstat(self._fd).st_size
+
+    def _pread(self, length, offset):
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, length, offset)
+        # Windows has no pread, so the shared offset is moved under a lock.
+        with self._seek_lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, length)
+
+    def read_range(self, offset, length):
+        if self.latency:
+            time.sleep(self.latency)
+        chunks = []
+        while length > 0:
+            chunk = self._pread(length, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+            length -= len(chunk)
+        data = b''.join(chunks)
+        with self._count_lock:
+            self.requests += 1
+            self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class RangeFile(io.RawIOBase):
+    """Seekable, read-only file object over a RangeReader.
+
+    The object is read in aligned blocks of block_size bytes, kept in an
+    LRU cache of up to cache_size bytes.  A read fetches all the blocks it
+    lacks with one request per contiguous run, so the small reads ZipFile
+    makes for the end record, the central directory and a local header
+    cost a round trip each only when they fall in different blocks.  When
+    reads run on from each other into a new block, the next prefetch
+    blocks are fetched ahead on up to workers threads.
+
+        zf = ZipFile(RangeFile(MyStoreReader(bucket, key)))
+    """
+
+    def __init__(self, reader, block_size=1 << 20, cache_size=64 << 20,
+                 prefetch=4, workers=4):
+        self._reader = reader
+        self._size = reader.size()
+        self.block_size = block_size
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+        self.workers = workers
+        self._pos = 0
+        self._last_end = None
+        # block index -> bytes, least recently used first
+        self._blocks = collections.OrderedDict()
+        self._cached = 0
+        # block index -> Future of the request fetching it
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            pos = offset
+        elif whence == 1:
+            pos = self._pos + offset
+        elif whence == 2:
+            pos = self._size + offset
+        else:
+            raise ValueError("invalid whence (%r, should be 0, 1 or 2)"
+                             % whence)
+        if pos < 0:
+            raise ValueError("negative seek position %r" % pos)
+        self._pos = pos
+        return pos
+
+    def read(self, n=-1):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        start = self._pos
+        end = self._size if n is None or n < 0 else min(start + n, self._size)
+        if start >= end:
+            return b''
+        bs = self.block_size
+        first, last = start // bs, (end - 1) // bs
+        blocks = self._get_blocks(first, last)
+        data = b''.join(blocks)
+        data = data[start - first * bs:end - first * bs]
+        # Reads within a block, such as a local header and the member data
+        # after it, run on from each other too; only one that carries on
+        # into the next block is streaming.
+        if self.prefetch and start == self._last_end and \
+                last > (start - 1) // bs:
+            self._prefetch(last + 1)
+        self._pos = self._last_end = end
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def _get_blocks(self, first, last):
+        found = {}
+        waits = {}
+        missing = []
+        with self._lock:
+            for index in range(first, last + 1):
+                block = self._blocks.get(index)
+                if block is not None:
+                    self._blocks.move_to_end(index)
+                    found[index] = block
+                elif index in self._pending:
+                    waits[index] = self._pending[index]
+                else:
+                    missing.append(index)
+        for run in self._runs(missing):
+            found.update(self._fetch(run[0], run[-1]))
+        for index, future in waits.items():
+            try:
+                found[index] = future.result()[index]
+            except Exception:
+                # A failed prefetch is retried here, where errors surface.
+                found.update(self._fetch(index, index))
+        return [found[index] for index in range(first, last + 1)]
+
+    @staticmethod
+    def _runs(indexes):
+        run = []
+        for index in indexes:
+            if run and index != run[-1] + 1:
+                yield run
+                run = []
+            run.append(index)
+        if run:
+            yield run
+
+    def _fetch(self, first, last):
+        # One request for blocks first to last; returns them by index.
+        bs = self.block_size
+        offset = first * bs
+        length = min((last + 1) * bs, self._size) - offset
+        data = self._reader.read_range(offset, length)
+        # A short range is only cached as the end of the object; anywhere
+        # else it would stand for whole blocks it does not hold.
+        if len(data) < length and offset + length < self._size:
+            raise OSError("read_range(%d, %d) returned %d bytes"
+                          % (offset, length, len(data)))
+        blocks = {}
+        with self._lock:
+            for index in range(first, last + 1):
+                block = data[(index - first) * bs:(index - first + 1) * bs]
+                blocks[index] = block
+                self._store(index, block)
+        return blocks
+
+    def _store(self, index, block):
+        old = self._blocks.pop(index, None)
+        if old is not None:
+            self._cached -= len(old)
+        self._blocks[index] = block
+        self._cached += len(block)
+        while self._cached > self.cache_size and len(self._blocks) > 1:
+            _, old = self._blocks.popitem(last=False)
+            self._cached -= len(old)
+
+    def _prefetch(self, first):
+        last = min(first + self.prefetch, -(-self._size // self.block_size)) - 1
+        with self._lock:
+            missing = [index for index in range(first, last + 1)
+                       if index not in self._blocks and
+                       index not in self._pending]
+            if not missing:
+                return
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(self.workers)
+            # Split the blocks into up to workers requests run in parallel.
+            per_request = -(-len(missing) // self.workers)
+            for run in self._runs(missing):
+                for i in range(0, len(run), per_request):
+                    part = run[i:i + per_request]
+                    future = self._pool.submit(self._fetch_ahead, part[0],
+                                               part[-1])
+                    for index in part:
+                        self._pending[index] = future
+
+    def _fetch_ahead(self, first, last):
+        try:
+            return self._fetch(first, last)
+        finally:
+            with self._lock:
+                for index in range(first, last + 1):
+                    self._pending.pop(index, None)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+            self._reader.close()
+        finally:
+            self._blocks.clear()
+            self._cached = 0
+            super().close()
@@ -0,0 +1,388 @@
+from .a import AESZipFile
+from .b import *
+
+import copy
+import struct
+
+# Stands in for the sizes of members whose local header leaves them to a
+# data descriptor.
+_UNKNOWN_SIZE = 1 << 62
+
+
+class _Stream:
+    """Forward-only reader over a file object that can take bytes back.
+
+    Only read() is required of fileobj; read1() is used when it exists, so
+    data is handed on as it arrives from a pipe or socket.
+    """
+
+    BLOCK_SIZE = 1 << 16
+
+    def __init__(self, fileobj):
+        self._read_raw = getattr(fileobj, 'read1', fileobj.read)
+        self._buf = bytearray()
+        self._pos = 0
+
+    def _fill(self, n):
+        # Buffer at least n bytes unless the stream ends first.
+        while len(self._buf) < n:
+            data = self._read_raw(max(n - len(self._buf), self.BLOCK_SIZE))
+            if not data:
+                break
+            self._buf += data
+
+    def peek(self, n):
+        self._fill(n)
+        return bytes(self._buf[:n])
+
+    def read(self, n):
+        self._fill(n)
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        self._pos += len(data)
+        return data
+
+    def read1(self, n):
+        if not self._buf:
+            data = self._read_raw(n)
+            self._pos += len(data)
+            return data
+        return self.read(min(n, len(self._buf)))
+
+    def skip(self, n):
+        while n > 0:
+            data = self.read1(min(n, self.BLOCK_SIZE))
+            if not data:
+                raise EOFError
+            n -= len(data)
+
+    def unread(self, data):
+        self._buf[:0] = data
+        self._pos -= len(data)
+
+    def tell(self):
+        return self._pos
+
+    def seekable(self):
+        return False
+
+
+class _StreamExtFile(AESZipExtFile):
+    """Reads one member of a _Stream.
+
+    Members whose sizes are left to a data descriptor are read until the
+    decompressor finds the end of the compressed data; the bytes it read
+    past that are handed back to the stream.  Stored members of that kind
+    end where a data descriptor signature is followed by the number of
+    bytes read so far.
+    """
+
+    def __init__(self, fileobj, mode, zipinfo, close_fileobj=False,
+                 pinyin=None, zip64=False):
+        self._zip64 = zip64
+        self._unknown = zipinfo.use_datadescripter and \
+            zipinfo.compress_size == 0
+        self._descriptor_read = not zipinfo.use_datadescripter
+        # Raw compressed bytes read after the encryption header, and those
+        # of them the decompressor may not have consumed yet.
+        self._raw_read = 0
+        self._window = b''
+        super().__init__(fileobj, mode, zipinfo, close_fileobj, pinyin)
+        self._header_length = len(getattr(self, 'encryption_header', b''))
+
+    def read_init(self):
+        super().read_init()
+        if self._unknown:
+            self._compress_left = _UNKNOWN_SIZE
+            self._left = _UNKNOWN_SIZE
+
+    @property
+    def _aes(self):
+        return self._zinfo.wz_aes_version is not None
+
+    def _read2(self, n):
+        if not self._unknown:
+            return super()._read2(n)
+        if self._compress_type == ZIP_STORED:
+            return self._read_stored(n)
+
+        keep = 0
+        if self._compress_type == ZIP_DEFLATED:
+            keep = len(self._decompressor.unconsumed_tail)
+        data = self._fileobj.read1(max(n, self.MIN_READ_SIZE))
+        if not data and not keep:
+            raise EOFError
+        self._raw_read += len(data)
+        self._consume(len(self._window) - keep)
+        self._window += data
+        if self._decrypter is None:
+            return data
+        if self._aes:
+            # The HMAC is only fed with bytes known to belong to the member.
+            return self._decrypter.decypter.decrypt(data)
+        return self._decrypter.decrypt(data)
+
+    def _consume(self, n):
+        if n <= 0:
+            return
+        if self._aes:
+            self._decrypter.hmac.update(self._window[:n])
+        self._window = self._window[n:]
+
+    def _read_stored(self, n):
+        hmac_size = AESZipDecrypter.hmac_size if self._aes else 0
+        n = max(n, self.MIN_READ_SIZE)
+        buf = self._fileobj.peek(n + hmac_size + 26)
+        end = buf.find(stringDataDescriptor, hmac_size)
+        while end != -1 and not self._is_descriptor(buf, end):
+            end = buf.find(stringDataDescriptor, end + 1)
+        if end != -1 and end - hmac_size <= n:
+            n = end - hmac_size
+            self._compress_left = 0
+        elif end == -1 and len(buf) < n + hmac_size + 26:
+            raise EOFError
+        else:
+            # Keep back what a descriptor starting later would cover.
+            n = min(n, len(buf) - hmac_size - 25)
+        data = self._fileobj.read(n)
+        self._raw_read += len(data)
+        if self._decrypter is not None:
+            data = self._decrypter.decrypt(data)
+        return data
+
+    def _is_descriptor(self, buf, end):
+        # A signature at buf[end] ends the member if both sizes after it
+        # count the bytes before it, the CRC matches where it can be worked
+        # out and another record or the end of the stream follows.
+        file_size = self._raw_read + end
+        compress_size = self._header_length + file_size
+        if self._aes:
+            file_size -= AESZipDecrypter.hmac_size
+        for fmt in ('<4sLLL', '<4sLQQ'):
+            size = struct.calcsize(fmt)
+            if len(buf) < end + size:
+                break
+            _, crc, csize, usize = struct.unpack(fmt, buf[end:end + size])
+            if (csize, usize) != (compress_size, file_size) or \
+                    buf[end + size:end + size + 2] not in (b'PK', b''):
+                continue
+            if self._aes:
+                return True
+            data = buf[:end]
+            if self._decrypter is not None:
+                data = copy.copy(self._decrypter).decrypt(data)
+            return crc32(data, self._running_crc) == crc
+        return False
+
+    def _settle(self):
+        # Hand back what was read past the end of the compressed data.
+        unused = len(self._decompressor.unused_data)
+        if self._compress_type == ZIP_DEFLATED and \
+                self._decompressor.unconsumed_tail:
+            # Ended by a bounded decompress(); flush() has then added the
+            # tail to unused_data a second time.
+            unused = len(self._decompressor.unconsumed_tail)
+        if unused:
+            self._fileobj.unread(self._window[-unused:])
+            self._window = self._window[:-unused]
+            self._raw_read -= unused
+        self._consume(len(self._window))
+        self._compress_left = 0
+
+    def _read_descriptor(self):
+        if self._descriptor_read:
+            return
+        self._descriptor_read = True
+        fmt = '<LQQ' if self._zip64 else '<LLL'
+        if self._fileobj.peek(4) == stringDataDescriptor:
+            self._fileobj.read(4)
+        data = self._fileobj.read(struct.calcsize(fmt))
+        if len(data) != struct.calcsize(fmt):
+            raise BadZipFile("Truncated data descriptor for file %r"
+                             % self.name)
+        crc, compress_size, file_size = struct.unpack(fmt, data)
+        if not self._unknown:
+            return
+        read = self._header_length + self._raw_read
+        if self._aes:
+            read += AESZipDecrypter.hmac_size
+        if compress_size != read or file_size != _UNKNOWN_SIZE - self._left:
+            raise BadZipFile("Data descriptor for file %r does not match "
+                             "its data" % self.name)
+        self._zinfo.CRC = crc
+        self._zinfo.compress_size = compress_size
+        self._zinfo.file_size = file_size
+        if self._expected_crc is not None:
+            self._expected_crc = crc
+
+    def check_wz_aes(self):
+        super().check_wz_aes()
+        self._read_descriptor()
+
+    def check_integrity(self):
+        if self._unknown and self._compress_type != ZIP_STORED:
+            self._settle()
+        if not self._aes:
+            self._read_descriptor()
+        super().check_integrity()
+
+    def skip(self):
+        """Move the stream past the rest of this member."""
+        if not self._eof:
+            if self._unknown:
+                while not self._eof:
+                    self._read1(self.MAX_BLOCK_SIZE)
+                return
+            self._fileobj.skip(self._compress_left)
+            self._compress_left = 0
+            self._eof = True
+            if self._aes:
+                self._fileobj.skip(AESZipDecrypter.hmac_size)
+        self._read_descriptor()
+
+
+class ZipStreamReader:
+    """Read the members of an archive in order from a forward-only stream.
+
+    fileobj only needs a read() method, so archives can be processed as
+    they arrive over a pipe or a socket instead of being spooled to disk
+    first.  Iterating yields (ZipInfo, file object) pairs, one per local
+    file header; the file object is only valid until the next member is
+    requested.  The central directory is never read, so the ZipInfo holds
+    what the local header and any data descriptor say.
+
+        for zinfo, fp in ZipStreamReader(sys.stdin.buffer, pinyin):
+            shutil.copyfileobj(fp, sink(zinfo.filename))
+    """
+
+    zipinfo_cls = AESZipInfo
+
+    def __init__(self, fileobj, pinyin=None):
+        self._stream = _Stream(fileobj)
+        self.pinyin = None
+        self.setpassword(pinyin)
+
+    def setpassword(self, pinyin):
+        """Set default password for encrypted files."""
+        if pinyin and not isinstance(pinyin, bytes):
+            raise TypeError("pinyin: expected bytes, got %s" % type(pinyin).__name__)
+        self.pinyin = pinyin or None
+
+    def __iter__(self):
+        stream = self._stream
+        if stream.peek(4) == stringDataDescriptor:
+            # Marker left by archives written to be split.
+            stream.read(4)
+        while True:
+            signature = stream.peek(4)
+            if signature != stringFileHeader:
+                if signature[:2] == b'PK' or not signature:
+                    # The central directory, or the end of the stream.
+                    return
+                raise BadZipFile("Bad magic number for file header")
+            zinfo, zip64 = self._read_local_header()
+            zef = _StreamExtFile(stream, 'r', zinfo, False, self.pinyin,
+                                 zip64=zip64)
+            yield zinfo, zef
+            zef.skip()
+
+    def _read_local_header(self):
+        stream = self._stream
+        offset = stream.tell()
+        header = stream.read(sizeFileHeader)
+        if len(header) != sizeFileHeader:
+            raise BadZipFile("Truncated file header")
+        (_, extract_version, _, flag_bits, compress_type, t, d, crc,
+         compress_size, file_size, filename_length,
+         extra_length) = struct.unpack(structFileHeader, header)
+        filename = stream.read(filename_length)
+        extra = stream.read(extra_length)
+        if len(filename) + len(extra) != filename_length + extra_length:
+            raise BadZipFile("Truncated file header")
+        # _StreamExtFile reads the header again.
+        stream.unread(header + filename + extra)
+
+        if flag_bits & 1 << 11:
+            # UTF-8 file names extension
+            filename = filename.decode('utf-8')
+        else:
+            # Historical ZIP filename encoding
+            filename = filename.decode('cp437')
+        zinfo = self.zipinfo_cls(filename)
+        zinfo.extra = extra
+        zinfo.header_offset = offset
+        zinfo.extract_version = extract_version
+        zinfo.flag_bits = flag_bits
+        zinfo.compress_type = compress_type
+        zinfo.CRC = crc
+        zinfo.compress_size = compress_size
+        zinfo.file_size = file_size
+        zinfo._raw_time = t
+        zinfo.date_time = ((d >> 9) + 1980, (d >> 5) & 0xF, d & 0x1F,
+                           t >> 11, (t >> 5) & 0x3F, (t & 0x1F) * 2)
+        zinfo._decodeExtra()
+        zip64 = 0xffffffff in (compress_size, file_size)
+        return zinfo, zip64
+
+
+class _ChunkSink:
+    """Collects what an archive writes until it is taken."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        # Copied, the writers reuse their buffers.
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def stream_zip(members, compression=ZIP_STORED, compresslevel=None, *,
+               encryption=None, encryption_kwargs=None, pinyin=None,
+               force_zip64=False, comment=b'', chunk_size=1 << 16):
+    """Generate an archive as a sequence of bytes chunks, without seeking.
+
+    members is an iterable of (name, chunks) pairs, where name is an
+    archive name or a ZipInfo and chunks an iterable of bytes-like objects
+    holding the member's data.  Every member is followed by a data
+    descriptor and the central directory comes last, so the output can go
+    straight to a socket or an HTTP response.  Chunks of about chunk_size
+    bytes are yielded as soon as they are ready; nothing larger than that,
+    or than one input chunk once compressed, is held.
+
+    Members larger than 4 GiB need force_zip64, or a ZipInfo whose
+    file_size says so, since the local header is written before the size
+    is known.  encryption, encryption_kwargs and pinyin are as for
+    AESZipFile.
+
+        body = stream_zip([(name, read_chunks(name)) for name in names],
+                          ZIP_DEFLATED, encryption=WZ_AES, pinyin=pinyin)
+    """
+    sink = _ChunkSink()
+    zf = AESZipFile(sink, 'w', compression=compression,
+                    compresslevel=compresslevel, encryption=encryption,
+                    encryption_kwargs=encryption_kwargs)
+    if pinyin is not None:
+        zf.setpassword(pinyin)
+    zf.comment = comment
+    for name, chunks in members:
+        with zf.open(name, 'w', force_zip64=force_zip64) as dest:
+            for chunk in chunks:
+                dest.write(chunk)
+                if sink.size >= chunk_size:
+                    yield sink.take()
+        if sink.size >= chunk_size:
+            yield sink.take()
+    zf.close()
+    yield sink.take()
@@ -0,0 +1,51 @@
+import pytest
+
+from gatecode.a import AESZipFile
+from gatecode.b import WZ_AES, WZ_AES_V1, WZ_AES_V2, ZIP_STORED
+from gatecode.d import CodeCache, archive_identity_
+
+PASSWORD = b'gatecode-test'
+
+
+def make_archive(path, source, version=WZ_AES_V2):
+    with AESZipFile(path, 'w', compression=ZIP_STORED, encryption=WZ_AES,
+                    encryption_kwargs={'force_wz_aes_version': version}) as zf:
+        zf.setpassword(PASSWORD)
+        zf.writestr('m.py', source)
+
+
+def open_archive(path):
+    zf = AESZipFile(path)
+    zf.setpassword(PASSWORD)
+    return zf
+
+
+def test_rebuilt_ae2_archive_misses_cache(tmp_path):
+    # Same names, sizes and offsets, and a CRC of 0 in both archives.
+    cache = CodeCache(tmp_path / 'cache')
+    old, new = tmp_path / 'old.zip', tmp_path / 'new.zip'
+    make_archive(old, b'x = 1\n')
+    make_archive(new, b'x = 2\n')
+    with open_archive(old) as zold, open_archive(new) as znew:
+        assert zold.getinfo('m.py').CRC == znew.getinfo('m.py').CRC == 0
+        assert archive_identity_(zold) != archive_identity_(znew)
+        for bind_archive in (True, False):
+            assert (cache._entry(zold, 'm.py', bind_archive)[0] !=
+                    cache._entry(znew, 'm.py', bind_archive)[0])
+            code = compile(zold.read('m.py'), 'm.py', 'exec')
+            cache.store(zold, 'm.py', code, bind_archive)
+            assert cache.load(zold, 'm.py', bind_archive) is not None
+            assert cache.load(znew, 'm.py', bind_archive) is None
+
+
+@pytest.mark.parametrize('version', [WZ_AES_V1, WZ_AES_V2])
+def test_entry_is_stable(tmp_path, version):
+    cache = CodeCache(tmp_path / 'cache')
+    path = tmp_path / 'a.zip'
+    make_archive(path, b'x = 1\n', version)
+    with open_archive(path) as zf:
+        identity = archive_identity_(zf)
+        entry = cache._entry(zf, 'm.py', True)[0]
+    with open_archive(path) as zf:
+        assert archive_identity_(zf) == identity
+        assert cache._entry(zf, 'm.py', True)[0] == entry
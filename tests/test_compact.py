@@ -0,0 +1,111 @@
+import os
+import shutil
+
+import pytest
+
+from gatecode.b import BadZipFile, ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+
+class Crash(Exception):
+    pass
+
+
+def make_archive(path):
+    """Write an archive with gaps for compact() and return its contents."""
+    contents = {}
+    with ZipFile(path, 'w', compression=ZIP_DEFLATED) as zf:
+        for i in range(20):
+            data = os.urandom(3000 + 100 * i) + b'x' * 5000
+            zf.writestr('m%02d' % i, data,
+                        compress_type=ZIP_STORED if i % 3 else None)
+            contents['m%02d' % i] = data
+    with ZipFile(path, 'a') as zf:
+        for i in (1, 4, 5, 11):
+            zf.remove('m%02d' % i)
+            del contents['m%02d' % i]
+        zf.replace('m07', b'replaced' * 500)
+        contents['m07'] = b'replaced' * 500
+    return contents
+
+
+def abandon(zf):
+    # What a crash leaves behind: no central directory written at close.
+    fp, zf.fp = zf.fp, None
+    fp.close()
+
+
+def check(path, contents):
+    with ZipFile(path) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in zf.namelist()} == contents
+
+
+def compact_crashing(path, monkeypatch, crash_on):
+    move_record = ZipFile._move_record
+    calls = []
+
+    def fake_move_record(self, start, size, dest):
+        calls.append(size)
+        if len(calls) == crash_on:
+            # Copy half the record first, as a crash mid-copy would.
+            move_record(self, start, size // 2, dest)
+            raise Crash
+        move_record(self, start, size, dest)
+
+    monkeypatch.setattr(ZipFile, '_move_record', fake_move_record)
+    zf = ZipFile(path, 'a')
+    with pytest.raises(Crash):
+        zf.compact()
+    abandon(zf)
+    monkeypatch.undo()
+    assert os.path.exists(str(path) + '.compact')
+
+
+@pytest.mark.parametrize('crash_on', [1, 2])
+def test_interrupted_compact_is_finished(tmp_path, monkeypatch, crash_on):
+    path = tmp_path / 'a.zip'
+    contents = make_archive(path)
+    reference = tmp_path / 'b.zip'
+    shutil.copy(path, reference)
+    with ZipFile(reference, 'a') as zf:
+        assert zf.compact()
+
+    compact_crashing(path, monkeypatch, crash_on)
+    with pytest.raises(BadZipFile):
+        ZipFile(path)
+    with ZipFile(path, 'a'):
+        pass
+    assert not os.path.exists(str(path) + '.compact')
+    check(path, contents)
+    with open(path, 'rb') as fp, open(reference, 'rb') as ref:
+        assert fp.read() == ref.read()
+
+
+def test_stale_journal_removed_by_new_archive(tmp_path, monkeypatch):
+    path = tmp_path / 'a.zip'
+    make_archive(path)
+    compact_crashing(path, monkeypatch, 1)
+    with ZipFile(path, 'w') as zf:
+        zf.writestr('new', b'new')
+    assert not os.path.exists(str(path) + '.compact')
+    check(path, {'new': b'new'})
+
+
+def test_budgeted_compact_matches_full_compact(tmp_path):
+    path = tmp_path / 'a.zip'
+    contents = make_archive(path)
+    reference = tmp_path / 'b.zip'
+    shutil.copy(path, reference)
+    with ZipFile(reference, 'a') as zf:
+        assert zf.compact()
+
+    calls = 0
+    done = False
+    while not done:
+        with ZipFile(path, 'a') as zf:
+            done = zf.compact(budget=4096)
+        calls += 1
+        check(path, contents)
+    assert calls > 2
+    with open(path, 'rb') as fp, open(reference, 'rb') as ref:
+        assert fp.read() == ref.read()
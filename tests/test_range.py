@@ -0,0 +1,61 @@
+import os
+import threading
+
+import pytest
+
+from gatecode.b import ZIP_DEFLATED, ZipFile
+from gatecode.r import LocalRangeReader, RangeFile
+
+
+@pytest.fixture(params=['pread', 'lseek'])
+def reader(request, tmp_path, monkeypatch):
+    if request.param == 'lseek':
+        # As on Windows.
+        monkeypatch.delattr(os, 'pread', raising=False)
+    path = tmp_path / 'a.bin'
+    path.write_bytes(bytes(range(256)) * 4096)
+    reader = LocalRangeReader(str(path))
+    yield reader
+    reader.close()
+
+
+def test_read_range(reader):
+    data = bytes(range(256)) * 4096
+    assert reader.size() == len(data)
+    assert reader.read_range(1000, 5000) == data[1000:6000]
+    assert reader.read_range(len(data) - 10, 100) == data[-10:]
+    assert reader.read_range(len(data), 100) == b''
+    assert reader.requests == 3
+
+
+def test_concurrent_read_range(reader):
+    data = bytes(range(256)) * 4096
+    errors = []
+
+    def run(seed):
+        for i in range(200):
+            offset = (seed * 7919 + i * 104729) % (len(data) - 4096)
+            if reader.read_range(offset, 4096) != data[offset:offset + 4096]:
+                errors.append(offset)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+def test_zipfile_over_range_file(tmp_path, monkeypatch):
+    monkeypatch.delattr(os, 'pread', raising=False)
+    path = str(tmp_path / 'a.zip')
+    contents = {'m%d' % i: os.urandom(500) * 20 for i in range(50)}
+    with ZipFile(path, 'w', compression=ZIP_DEFLATED) as zf:
+        for name, data in contents.items():
+            zf.writestr(name, data)
+    fp = RangeFile(LocalRangeReader(path), block_size=16 << 10)
+    try:
+        with ZipFile(fp) as zf:
+            assert {name: zf.read(name) for name in zf.namelist()} == contents
+    finally:
+        fp.close()
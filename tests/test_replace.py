@@ -0,0 +1,67 @@
+import pytest
+
+from gatecode.a import AESZipFile
+from gatecode.b import WZ_AES, ZIP_DEFLATED, ZipFile
+
+PASSWORD = b'gatecode-test'
+
+
+def make_archive(path, nbits=256):
+    with AESZipFile(path, 'w', compression=ZIP_DEFLATED, encryption=WZ_AES,
+                    encryption_kwargs={'nbits': nbits}) as zf:
+        zf.setpassword(PASSWORD)
+        zf.writestr('a', b'old contents' * 100)
+        zf.setencryption(None)
+        zf.setpassword(None)
+        zf.writestr('plain', b'plain contents')
+
+
+@pytest.mark.parametrize('nbits, strength', [(128, 1), (192, 2), (256, 3)])
+def test_replace_keeps_encryption(tmp_path, nbits, strength):
+    path = tmp_path / 'a.zip'
+    make_archive(path, nbits)
+    with AESZipFile(path, 'a') as zf:
+        zf.replace('a', b'new contents', pinyin=PASSWORD)
+    with AESZipFile(path) as zf:
+        zinfo = zf.getinfo('a')
+        assert zinfo.flag_bits & 0x1
+        assert zinfo.wz_aes_strength == strength
+        assert zinfo.compress_type == ZIP_DEFLATED
+        with pytest.raises(RuntimeError):
+            zf.read('a')
+        assert zf.read('a', PASSWORD) == b'new contents'
+        assert zf.read('plain') == b'plain contents'
+
+
+def test_replace_uses_archive_password(tmp_path):
+    path = tmp_path / 'a.zip'
+    make_archive(path)
+    with AESZipFile(path, 'a') as zf:
+        zf.setpassword(PASSWORD)
+        zf.replace('a', b'new contents')
+    with AESZipFile(path) as zf:
+        assert zf.read('a', PASSWORD) == b'new contents'
+
+
+def test_replace_encrypted_without_password(tmp_path):
+    path = tmp_path / 'a.zip'
+    make_archive(path)
+    with open(path, 'rb') as fp:
+        before = fp.read()
+    with AESZipFile(path, 'a') as zf:
+        with pytest.raises(RuntimeError):
+            zf.replace('a', b'new contents')
+        with pytest.raises(RuntimeError):
+            zf.replace('a', b'new contents', pinyin=b'wrong')
+    with open(path, 'rb') as fp:
+        assert fp.read() == before
+
+
+def test_replace_plain_member_stays_plain(tmp_path):
+    path = tmp_path / 'a.zip'
+    make_archive(path)
+    with AESZipFile(path, 'a') as zf:
+        zf.replace('plain', b'new plain')
+    with ZipFile(path) as zf:
+        assert not zf.getinfo('plain').flag_bits & 0x1
+        assert zf.read('plain') == b'new plain'